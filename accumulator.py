@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import threading
+import numpy as np
+
+class Accumulator(object):
+    """Running statistics of the frames of one channel.
+
+    The mean and variance are updated with Welford's method and the samples
+    are counted in a (voltage bin, time bin) histogram, the host-side
+    persistence. Memory is fixed by the number of points and bins, not by
+    the number of frames.
+    """
+    def __init__(self, points, interval, vrange, tbins=512, vbins=256):
+        self.points = points
+        self.interval = interval
+        self.vrange = vrange
+        self.count = 0
+        self.mean = np.zeros(points)
+        self.m2 = np.zeros(points)
+        self._delta = np.empty(points)
+        self._tmp = np.empty(points)
+        tbins = min(tbins, points)
+        self.columns = np.arange(points) * tbins // points # time bin of each sample
+        self.hist = np.zeros((vbins, tbins), dtype=np.int64)
+
+    def add(self, wave):
+        wave = np.asarray(wave, dtype=np.float64)
+        self.count += 1
+        delta = np.subtract(wave, self.mean, out=self._delta)
+        np.divide(delta, self.count, out=self._tmp)
+        self.mean += self._tmp
+        np.subtract(wave, self.mean, out=self._tmp)
+        self._tmp *= delta
+        self.m2 += self._tmp
+        self._histogram(wave)
+
+    def _histogram(self, wave):
+        vbins, tbins = self.hist.shape
+        low, high = self.vrange
+        rows = np.floor((wave - low) * (vbins / (high - low))).astype(np.intp)
+        # samples outside of the range are not counted
+        inside = (rows >= 0) & (rows < vbins)
+        cells = rows[inside] * tbins + self.columns[inside]
+        self.hist += np.bincount(cells, minlength=self.hist.size).reshape(self.hist.shape)
+
+    def variance(self):
+        if self.count < 2:
+            return np.zeros(self.points)
+        return self.m2 / (self.count - 1)
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def extent(self):
+        """[left, right, bottom, top] of the histogram for imshow."""
+        return [0.0, self.points * self.interval, self.vrange[0], self.vrange[1]]
+
+class FrameAccumulator(object):
+    """Accumulates the frames of every channel, shared by the worker and
+    the GUI.
+
+    The voltage range of the histograms is taken from the first frame (with
+    a margin) and is common to all channels so that they can be drawn on
+    the same axes. A channel starts again when its points or interval
+    change; clear() starts all of them again.
+    """
+    def __init__(self, tbins=512, vbins=256, margin=0.25):
+        self.tbins = tbins
+        self.vbins = vbins
+        self.margin = margin
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.channels = {}
+        self.vrange = None
+
+    def clear(self):
+        with self.lock:
+            self.channels = {}
+            self.vrange = None
+
+    def add(self, frame):
+        if not self.enabled:
+            return
+        intervals = frame.get('intervals', {})
+        with self.lock:
+            if self.vrange is None:
+                low = min(np.asarray(frame['waves'][name]).min() for name in frame['channels'])
+                high = max(np.asarray(frame['waves'][name]).max() for name in frame['channels'])
+                margin = (high - low) * self.margin or 1.0
+                self.vrange = (float(low - margin), float(high + margin))
+            for name in frame['channels']:
+                wave = frame['waves'][name]
+                interval = intervals.get(name, frame['interval'])
+                accumulator = self.channels.get(name)
+                if (accumulator is None or accumulator.points != len(wave) or
+                        accumulator.interval != interval):
+                    accumulator = Accumulator(len(wave), interval, self.vrange,
+                                              self.tbins, self.vbins)
+                    self.channels[name] = accumulator
+                accumulator.add(wave)
+
+    def names(self):
+        with self.lock:
+            return sorted(self.channels)
+
+    def count(self):
+        """Frames accumulated (by the channel with most of them)."""
+        with self.lock:
+            return max([accumulator.count for accumulator in self.channels.values()] or [0])
+
+    def average(self, name):
+        """Return (count, interval, mean, std) of a channel (copies) or None."""
+        with self.lock:
+            accumulator = self.channels.get(name)
+            if accumulator is None or not accumulator.count:
+                return None
+            return (accumulator.count, accumulator.interval,
+                    accumulator.mean.copy(), accumulator.std())
+
+    def persistence(self, names):
+        """Return (layers, extent): the histograms of names as a
+        (vbins, tbins, len(names)) array scaled to 0..1 (logarithmically, so
+        that rare samples are still visible), or (None, None).
+
+        Only the channels with the time base of the first one are included
+        (they are zero otherwise).
+        """
+        with self.lock:
+            accumulators = [self.channels.get(name) for name in names]
+            first = next((a for a in accumulators if a is not None and a.count), None)
+            if first is None:
+                return None, None
+            layers = np.zeros(first.hist.shape + (len(names),))
+            for i, accumulator in enumerate(accumulators):
+                if (accumulator is None or accumulator.hist.shape != first.hist.shape or
+                        accumulator.extent() != first.extent()):
+                    continue
+                layer = np.log1p(accumulator.hist)
+                peak = layer.max()
+                if peak > 0:
+                    layers[:, :, i] = layer / peak
+            return layers, first.extent()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+# Benchmarks of the acquisition hot paths against the simulator:
+# $ python bench.py --output bench.json
+#
+# Times end-to-end acquisitions, waveform parsing, FFT and plotting for
+# 5120, 30000 and 102400 points and writes the results as JSON so they can
+# be compared between versions. --fast disables the serial line delays to
+# measure only the host side.
+
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+from simulator import Simulator
+from instrument import Instrument, defaultSettings, parseAscii, parseBinary
+from waveform import Waveform
+
+POINTS = [5120, 30000, 102400]
+
+# (points, transfer) -> settings that make Instrument.acquire use them
+ACQUISITIONS = [
+    (5120, 'ascii', {'longmem': False, 'binary': False}),
+    (5120, 'binary', {'longmem': False, 'binary': True}),
+    (30000, 'ascii', {'longmem': True, 'binary': False}),
+    (102400, 'binary', {'longmem': True, 'binary': True}),
+]
+
+def timeit(function, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return {'best': min(times), 'mean': sum(times) / len(times), 'repeat': repeat}
+
+def bench_acquire(results, repeat, baudrate):
+    simulator = Simulator(baudrate=baudrate).start()
+    instrument = Instrument(simulator.port)
+    try:
+        for points, transfer, overrides in ACQUISITIONS:
+            settings = defaultSettings(['CH1', 'CH2'])
+            settings['host'] = True
+            settings.update(overrides)
+            stats = timeit(lambda: instrument.acquire(settings), repeat)
+            stats.update({'stage': 'acquire', 'points': points, 'transfer': transfer})
+            results.append(stats)
+    finally:
+        instrument.close()
+        simulator.close()
+
+def bench_host(results, repeat):
+    simulator = Simulator(baudrate=None)
+    simulator.tdiv = 1e-3
+    try:
+        for points in POINTS:
+            simulator.points = points
+            samples = simulator.wave('CH1')
+            ascii_reply = ','.join(str(v) for v in samples)
+            binary_data = samples.tostring()
+            wave = Waveform(parseBinary(binary_data), 1e-6, 'CH1').volts
+            for stage, transfer, function in [
+                    ('parse', 'ascii', lambda: parseAscii(ascii_reply)),
+                    ('parse', 'binary', lambda: parseBinary(binary_data)),
+                    ('fft', None, lambda: np.fft.rfft(wave) / points)]:
+                stats = timeit(function, repeat)
+                stats.update({'stage': stage, 'points': points, 'transfer': transfer})
+                results.append(stats)
+    finally:
+        simulator.close()
+
+def bench_plot(results, repeat):
+    try:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+    except ImportError:
+        sys.stderr.write('matplotlib not available, skipping the plot benchmark\n')
+        return
+    from plotting import PlotManager
+    for points in POINTS:
+        fig = Figure()
+        ax = fig.add_subplot(111)
+        plot = PlotManager(FigureCanvasAgg(fig), ax)
+        x = np.arange(points) * 1e-6
+        curves = {'CH1': np.sin(x * 1e4), 'CH2': np.cos(x * 1e4)}
+        plot.update('time', x, curves) # first full draw
+        stats = timeit(lambda: plot.update('time', x, curves), repeat)
+        stats.update({'stage': 'plot', 'points': points})
+        results.append(stats)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the DS-8812 acquisition paths')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions per benchmark')
+    parser.add_argument('--fast', action='store_true', help='no serial line delays')
+    parser.add_argument('--output', default='bench.json', help='JSON results file')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    results = []
+    bench_acquire(results, args.repeat, None if args.fast else 115200)
+    bench_host(results, args.repeat)
+    bench_plot(results, args.repeat)
+    for r in results:
+        print('%-8s %7d %-7s best %8.4f s  mean %8.4f s' %
+              (r['stage'], r['points'], r.get('transfer') or '', r['best'], r['mean']))
+    with open(args.output, 'w') as f:
+        json.dump({'time': time.time(),
+                   'python': platform.python_version(),
+                   'numpy': np.__version__,
+                   'baudrate': None if args.fast else 115200,
+                   'results': results}, f, indent=1)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
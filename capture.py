@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+# Headless captures without PyQt or matplotlib, e.g. from cron:
+# $ python capture.py --port /dev/ttyUSB0 --channels CH1,CH2 --count 10 --output run1
+#
+# Each frame's measurements are printed as a JSON line. With --output the
+# frames are also recorded (see recorder.py).
+#
+# --port can be given several times to capture from several scopes at once
+# (see pool.py); each scope is then recorded in a subdirectory of --output.
+#
+# --mask checks every frame against a mask saved from the GUI (see
+# masks.py) and --failures saves only the frames that fail, for soak tests.
+
+import sys
+import json
+import time
+import logging
+import argparse
+from instrument import Instrument, defaultSettings
+from recorder import Recording
+from pool import ScopePool, PoolRecording
+from masks import MaskTester
+from profiling import profiler
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Capture frames from an IWATSU DS-8812')
+    parser.add_argument('--port', action='append', help='serial port (repeat for several scopes)')
+    parser.add_argument('--channels', default='CH1', help='comma separated channels (CH1,CH2)')
+    parser.add_argument('--count', type=int, default=1, help='number of frames')
+    parser.add_argument('--wait', type=float, default=0.0, help='seconds between frames')
+    parser.add_argument('--long', action='store_true', help='use the long memory')
+    parser.add_argument('--ascii', action='store_true', help='disable binary transfers')
+    parser.add_argument('--bwl', action='store_true', help='enable the bandwidth limit')
+    parser.add_argument('--coupling', choices=['AC', 'DC', 'GND'], help='channel coupling')
+    parser.add_argument('--aset', action='store_true', help='autoset before capturing')
+    parser.add_argument('--measure', choices=['instrument', 'host', 'none'], default='host',
+                        help='where to compute the measurements')
+    parser.add_argument('--output', help='record the frames to this directory')
+    parser.add_argument('--mask', help='check the frames against this mask (.npz)')
+    parser.add_argument('--failures', help='record the frames failing the mask to this directory')
+    parser.add_argument('--verbose', action='store_true', help='log the commands sent')
+    parser.add_argument('--profile', help='write the timings of the capture to this JSON file')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(name)s: %(message)s')
+    channels = [channel.strip().upper() for channel in args.channels.split(',')]
+    for channel in channels:
+        if channel not in ('CH1', 'CH2'):
+            sys.stderr.write('Unknown channel %s\n' % channel)
+            return 1
+
+    ports = args.port or ['/dev/ttyUSB0']
+    report = lambda message: sys.stderr.write(message + '\n')
+    if len(ports) > 1:
+        instrument = ScopePool(ports, status=report)
+    else:
+        instrument = Instrument(ports[0], status=report)
+    try:
+        instrument.open()
+    except Exception as e:
+        sys.stderr.write('%s\n' % e)
+        return 1
+
+    settings = defaultSettings(channels)
+    settings['binary'] = not args.ascii
+    settings['longmem'] = args.long
+    settings['host'] = args.measure == 'host'
+    if args.measure == 'none':
+        settings['measurements'] = []
+    for channel in channels:
+        instrument.setChannel(channel, True)
+        settings['bwl'][channel] = args.bwl
+        if args.coupling:
+            instrument.setCoupling(channel, args.coupling)
+            settings['coupling'][channel] = args.coupling
+    if args.aset:
+        instrument.aset()
+
+    recording = None
+    if args.output:
+        if len(ports) > 1:
+            recording = PoolRecording(args.output, ports)
+        else:
+            recording = Recording(args.output)
+    masks = None
+    if args.mask:
+        masks = MaskTester()
+        masks.load(args.mask)
+        if args.failures:
+            if len(ports) > 1:
+                masks.setOutput(PoolRecording(args.failures, ports), args.failures)
+            else:
+                masks.setOutput(Recording(args.failures), args.failures)
+    try:
+        for i in range(args.count):
+            frame = instrument.acquire(settings)
+            if recording is not None:
+                recording.append(frame)
+            results = masks.add(frame) if masks is not None else None
+            measurements = dict(('%s %s' % key, value)
+                                for key, value in frame['measurements'].items())
+            line = {'frame': i, 'time': frame['time'],
+                    'interval': frame['interval'], 'points': frame['points'],
+                    'measurements': measurements}
+            if frame.get('errors'):
+                line['errors'] = frame['errors']
+            if results is not None:
+                line['mask'] = results
+            print(json.dumps(line))
+            sys.stdout.flush()
+            if args.wait and i + 1 < args.count:
+                time.sleep(args.wait)
+    finally:
+        if recording is not None:
+            recording.close()
+        if masks is not None:
+            if masks.recording is not None:
+                masks.recording.close()
+            masks.close()
+            sys.stderr.write('%s\n' % json.dumps(masks.summary()))
+        instrument.close()
+        if args.profile:
+            profiler.exportJson(args.profile)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
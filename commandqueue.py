@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+class Future(object):
+    """Result of a call run by a CommandQueue."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = []
+        self._result = None
+        self._error = None
+
+    def done(self):
+        return self.event.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the call and return its result (or raise its error)."""
+        if not self.event.wait(timeout):
+            raise RuntimeError('Timeout waiting for the command queue')
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def exception(self, timeout=None):
+        if not self.event.wait(timeout):
+            raise RuntimeError('Timeout waiting for the command queue')
+        return self._error
+
+    def add_done_callback(self, fn):
+        """Call fn(future) when done, on the queue thread (or now if it is
+        already done)."""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(fn)
+                return
+        fn(self)
+
+    def _set(self, result, error):
+        with self.lock:
+            self._result = result
+            self._error = error
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+class CommandQueue(object):
+    """Runs calls (e.g. Instrument methods) on one thread in the order they
+    were submitted, so that the caller never waits for the serial port.
+
+    submit() returns a Future. In the GUI, use a done callback that emits
+    a Qt signal to get the result back to the GUI thread.
+    """
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        """Run the calls already submitted and stop the thread."""
+        if self.thread is not None:
+            self.jobs.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.jobs.put((future, fn, args, kwargs))
+        self.start()
+        return future
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            future, fn, args, kwargs = job
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                future._set(None, e)
+            else:
+                future._set(result, None)
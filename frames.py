@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import threading
+import numpy as np
+from waveform import Waveform
+
+class FrameRing(object):
+    """Fixed-size ring of acquired frames shared by the worker and the GUI.
+
+    Each slot holds the raw samples of the Waveforms of one frame as a
+    (channels, points) integer array plus its metadata. Pushing into a full
+    ring drops the oldest frame.
+    """
+    def __init__(self, capacity=16):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.data = None
+        self.meta = [None] * capacity
+        self.headers = [None] * capacity # (channel, scale, interval, time) of each wave
+        self.head = 0 # next slot to write
+        self.count = 0
+        self.total = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        with self.lock:
+            self.head = 0
+            self.count = 0
+
+    def push(self, waves, meta):
+        """Push the Waveforms (all of the same length) of a frame."""
+        shape = (len(waves), len(waves[0]))
+        dtype = np.result_type(*[wave.raw for wave in waves])
+        with self.lock:
+            # (re)allocate when the number of channels, points or the sample
+            # type (binary/ascii) change
+            if (self.data is None or self.data.shape[1:] != shape or
+                    self.data.dtype != dtype):
+                self.data = np.empty((self.capacity,) + shape, dtype=dtype)
+                self.head = 0
+                self.count = 0
+            for i, wave in enumerate(waves):
+                self.data[self.head, i] = wave.raw
+            self.headers[self.head] = [(wave.channel, wave.scale, wave.interval, wave.time)
+                                       for wave in waves]
+            self.meta[self.head] = meta
+            self.head = (self.head + 1) % self.capacity
+            if self.count == self.capacity:
+                self.dropped += 1
+            else:
+                self.count += 1
+            self.total += 1
+
+    def _waves(self, i):
+        return [Waveform(raw, interval, channel, scale, timestamp)
+                for raw, (channel, scale, interval, timestamp)
+                in zip(self.data[i].copy(), self.headers[i])]
+
+    def latest(self):
+        """Return the newest (Waveforms (copies), meta) or (None, None)."""
+        with self.lock:
+            if not self.count:
+                return None, None
+            i = (self.head - 1) % self.capacity
+            return self._waves(i), self.meta[i]
+
+    def frames(self):
+        """Return all the (Waveforms (copies), meta) from oldest to newest."""
+        with self.lock:
+            start = self.head - self.count
+            return [(self._waves(i % self.capacity), self.meta[i % self.capacity])
+                    for i in range(start, self.head)]
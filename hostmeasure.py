@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+# Measurements computed on the host from a captured waveform. They mirror the
+# direct measurements of the scope (see scheduler.MEASUREMENTS) so that an
+# acquisition only needs the waveform transfers.
+#
+# Thresholds follow the settings of the scope:
+#   level: LEVL 10~90, used by FREQ, PERIOD, +PW, -PW and DUTY
+#   low, high, base: MCND base, low-high, used by TR and TF
+#     base: T-B (top-base from the histogram) or P-P (max-min)
+#   skew: SKLV ch1_level, ch1_edge, ch2_level, ch2_edge, used by SKEW
+#
+# Edges are found with a hysteresis of HYSTERESIS % of the amplitude around
+# each level.
+
+import numpy as np
+
+HYSTERESIS = 5
+
+# the defaults of the scope: 'level' (LEVL, %) is used by FREQ, PERIOD,
+# +PW, -PW and DUTY, 'base' (T-B or P-P), 'high' and 'low' (MCND, %) by TR
+# and TF and 'skew' (SKLV, % and RISE/FALL of each channel) by SKEW
+THRESHOLDS = {
+    'level': 50,
+    'low': 10,
+    'high': 90,
+    'base': 'T-B',
+    'skew': (50, 'RISE', 50, 'RISE'),
+}
+
+def setThreshold(thresholds, name, value):
+    """Update the thresholds dict with the value of a LEVL, MCND or SKLV
+    command, e.g. ('MCND', 'T-B,90,10'). Return False if name isn't one of
+    them; raise ValueError if the value is out of range."""
+    if name not in ('LEVL', 'MCND', 'SKLV'):
+        return False
+    fields = [field.strip() for field in str(value).split(',')]
+    try:
+        if name == 'LEVL':
+            level, = [int(field) for field in fields]
+            valid = 10 <= level <= 90
+            update = {'level': level}
+        elif name == 'MCND':
+            base, high, low = fields[0], int(fields[1]), int(fields[2])
+            valid = base in ('T-B', 'P-P') and 10 <= low < high <= 90
+            update = {'base': base, 'low': low, 'high': high}
+        else:
+            level1, edge1, level2, edge2 = fields
+            skew = (int(level1), edge1, int(level2), edge2)
+            valid = edge1 in ('RISE', 'FALL') and edge2 in ('RISE', 'FALL')
+            update = {'skew': skew}
+    except (IndexError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError('Bad %s %s' % (name, value))
+    thresholds.update(update)
+    return True
+
+def levels(wave, base='T-B'):
+    """Return the (base, top) voltages of wave."""
+    if base == 'P-P':
+        return wave.min(), wave.max()
+    # most common value in the lower and upper half of the histogram
+    hist, edges = np.histogram(wave, bins=256)
+    centers = (edges[:-1] + edges[1:]) / 2.0
+    half = len(hist) // 2
+    return centers[np.argmax(hist[:half])], centers[half + np.argmax(hist[half:])]
+
+def states(wave, level, band):
+    """Return +1 where wave was last above level + band, -1 where it was
+    last below level - band and 0 before it left the band the first time."""
+    state = np.zeros(len(wave), dtype=np.int8)
+    state[wave > level + band] = 1
+    state[wave < level - band] = -1
+    # carried forward inside the band
+    last = np.maximum.accumulate(np.where(state != 0, np.arange(len(wave)), 0))
+    return state[last]
+
+def crossings(wave, level, band=0.0):
+    """Return the interpolated sample positions of the rising and falling
+    crossings of level.
+
+    Like a trigger with hysteresis, a crossing only counts once the wave
+    has left the band level +- band on the other side, so noise around
+    the level doesn't add edges.
+    """
+    index = np.arange(len(wave))
+    state = states(wave, level, band)
+    changes = np.flatnonzero(state[1:] * state[:-1] < 0) + 1
+    rising = state[changes] > 0
+    # the level itself was crossed after the last sample on the other side
+    below = np.maximum.accumulate(np.where(wave <= level, index, 0))
+    above = np.maximum.accumulate(np.where(wave > level, index, 0))
+    idx = np.where(rising, below[changes - 1], above[changes - 1])
+    y0 = wave[idx]
+    y1 = wave[idx + 1]
+    pos = idx + (level - y0) / (y1 - y0)
+    return pos[rising], pos[~rising]
+
+def _following(a, b):
+    """For each position in a, the first position of b after it (nan if none)."""
+    i = np.searchsorted(b, a, side='right')
+    out = np.empty(len(a))
+    out.fill(np.nan)
+    ok = i < len(b)
+    out[ok] = b[i[ok]]
+    return out
+
+def _preceding(a, b):
+    """For each position in a, the last position of b before it (nan if none)."""
+    i = np.searchsorted(b, a, side='left') - 1
+    out = np.empty(len(a))
+    out.fill(np.nan)
+    ok = i >= 0
+    out[ok] = b[i[ok]]
+    return out
+
+def _mean(values):
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return None
+    return float(values.mean())
+
+def _transition(starts, ends, previous):
+    """Mean time from each end to the last start before it, ignoring starts
+    that belong to an earlier transition (before the previous end)."""
+    begin = _preceding(ends, starts)
+    prev = _preceding(ends, previous)
+    with np.errstate(invalid='ignore'):
+        begin[begin < prev] = np.nan
+    return _mean(ends - begin)
+
+def measure(wave, interval, modes=None, level=50, low=10, high=90, base='T-B'):
+    """Return a dict mode -> value (None if it can't be measured).
+
+    wave is the captured waveform in volts sampled every interval seconds.
+    modes is a list of measurement modes (default: all of them).
+    """
+    wave = np.asarray(wave, dtype=np.float64)
+    if modes is None:
+        modes = ['PERIOD', 'DUTY', 'VMEAN', 'FREQ', 'VRMS', 'P-P',
+                 'TR', 'TF', '+PW', '-PW', '+PEAK', '-PEAK']
+    results = {}
+    vbase, vtop = levels(wave, base)
+    amplitude = vtop - vbase
+    band = amplitude * HYSTERESIS / 100.0
+    rise, fall = crossings(wave, vbase + amplitude * level / 100.0, band)
+
+    period = None
+    if len(rise) > 1:
+        period = float(np.diff(rise).mean()) * interval
+    pos_pw = _mean(_following(rise, fall) - rise)
+    neg_pw = _mean(_following(fall, rise) - fall)
+    if pos_pw is not None:
+        pos_pw *= interval
+    if neg_pw is not None:
+        neg_pw *= interval
+
+    for mode in modes:
+        if mode == 'PERIOD':
+            results[mode] = period
+        elif mode == 'FREQ':
+            results[mode] = 1.0 / period if period else None
+        elif mode == 'DUTY':
+            if period and pos_pw is not None:
+                results[mode] = 100.0 * pos_pw / period
+            else:
+                results[mode] = None
+        elif mode == '+PW':
+            results[mode] = pos_pw
+        elif mode == '-PW':
+            results[mode] = neg_pw
+        elif mode == 'VMEAN':
+            results[mode] = float(wave.mean())
+        elif mode == 'VRMS':
+            results[mode] = float(np.sqrt(np.dot(wave, wave) / len(wave)))
+        elif mode == 'P-P':
+            results[mode] = float(wave.max() - wave.min())
+        elif mode == '+PEAK':
+            results[mode] = float(wave.max())
+        elif mode == '-PEAK':
+            results[mode] = float(wave.min())
+        elif mode in ('TR', 'TF'):
+            lo_rise, lo_fall = crossings(wave, vbase + amplitude * low / 100.0, band)
+            hi_rise, hi_fall = crossings(wave, vbase + amplitude * high / 100.0, band)
+            if mode == 'TR':
+                t = _transition(lo_rise, hi_rise, hi_rise)
+            else:
+                t = _transition(hi_fall, lo_fall, lo_fall)
+            results[mode] = t * interval if t is not None else None
+        else:
+            raise ValueError('Unknown measurement mode: %s' % mode)
+    return results
+
+def skew(wave1, wave2, interval, level=50, base='T-B', edges=('RISE', 'RISE'), level2=None):
+    """Mean delay from each edge of wave1 to the nearest edge of wave2
+    (None if either has no edges). level2 is the level of wave2 (default:
+    level) and edges the direction of the edges of each wave."""
+    if level2 is None:
+        level2 = level
+    found = []
+    for wave, wave_level, edge in zip((wave1, wave2), (level, level2), edges):
+        wave = np.asarray(wave, dtype=np.float64)
+        vbase, vtop = levels(wave, base)
+        rise, fall = crossings(wave, vbase + (vtop - vbase) * wave_level / 100.0,
+                               (vtop - vbase) * HYSTERESIS / 100.0)
+        found.append(rise if edge == 'RISE' else fall)
+    edges1, edges2 = found
+    if len(edges1) == 0 or len(edges2) == 0:
+        return None
+    i = np.searchsorted(edges2, edges1)
+    before = edges2[np.maximum(i - 1, 0)]
+    after = edges2[np.minimum(i, len(edges2) - 1)]
+    nearest = np.where(np.abs(before - edges1) <= np.abs(after - edges1), before, after)
+    return float((nearest - edges1).mean()) * interval
@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+# Driver for the DS-8812 that doesn't depend on PyQt or matplotlib, used by
+# the GUI (logic.py) and by headless captures (capture.py).
+
+import time
+import logging
+import functools
+import threading
+import serial
+from serialbuffer import SerialBuffer
+from scheduler import MeasurementScheduler, MEASUREMENTS
+import hostmeasure
+from profiling import profiler
+from waveform import Waveform, parseAscii, parseBinary
+
+log = logging.getLogger(__name__)
+
+# settings whose last value is remembered to skip commands that wouldn't
+# change anything
+CACHED_SETTINGS = ('DTFORM', 'MLEN', 'DTRANGE', 'DTPOINTS', 'WAVESRC', 'DIRM', 'PERS', 'EQU', 'TDIV',
+                   'C1:TRA', 'C2:TRA', 'C1:CPL', 'C2:CPL', 'C1:BWL', 'C2:BWL',
+                   'PROBE', 'AVGCNT', 'LEVL', 'MCND', 'SKLV')
+# settings only changed through the serial port: the front panel can change
+# all the others (and the replies of the cached queries), so without a
+# panel_query they are only cached within one acquisition
+REMOTE_SETTINGS = ('DTFORM', 'DTRANGE', 'DTPOINTS', 'WAVESRC')
+# queries whose reply only changes when a setting changes
+CACHED_QUERIES = ('TDIV?',)
+# commands after which the scope settings are unknown
+INVALIDATING = ('ASET',)
+# record length of each memory length
+RECORD = {'SHORT': 5120, 'LONG': 102400}
+# ascii transfers of more points take too long
+ASCII_POINTS = 30000
+# DTWAVE? transfers DTPOINTS samples evenly spread over the record range
+# set with RANGE_COMMAND start,stop (the samples start <= i < stop). This
+# command is not in our copy of the manual: change it here if the scope
+# names it differently.
+RANGE_COMMAND = 'DTRANGE'
+# seconds without a byte from the scope before a command is retried, by
+# command name (DTWAVE? can take a while to start sending)
+TIMEOUTS = {'ASET': 10.0, 'DTWAVE?': 3.0}
+DEFAULT_TIMEOUT = 1.0
+# the port is polled at this interval to check the timeouts above
+POLL_INTERVAL = 0.1
+
+class InstrumentError(Exception):
+    """The scope didn't answer a command needed to go on."""
+    pass
+
+def locked(method):
+    # the GUI, the worker and the command queue may share an instrument:
+    # run each transaction (or whole acquisition) alone
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class Instrument(object):
+    """DS-8812 on a serial port.
+
+    Errors (nack, timeouts) are reported by calling status with a message;
+    by default they are logged. The commands sent are logged at debug level
+    and their latency and size go to the profiler.
+    Commands that time out or get a garbled reply are retried up to retries
+    times after dropping the rest of the reply; nacks are not retried.
+
+    panel_query is a cheap query whose reply changes when the settings are
+    changed on the front panel. When set, it is sent before each acquisition
+    and the shadow state is dropped if its reply changed. Otherwise the
+    settings the front panel can change are only cached within an
+    acquisition: TDIV? is queried once per acquisition and the commands
+    sent outside of one (e.g. by the GUI) are never skipped.
+    """
+    panel_query = None
+
+    def __init__(self, port, status=None, retries=2):
+        self.port = port
+        self.status = status
+        self.retries = retries
+        self.lock = threading.RLock()
+        self.serial_port = None
+        self.reader = None
+        self.binary = False
+        self.record = RECORD['SHORT']
+        self.points = None # DTPOINTS of the last transfer
+        self.range = None # RANGE_COMMAND set by fetchWave, None for the whole record
+        self.ranges = True # False once the scope rejected RANGE_COMMAND
+        self.throughput = 0.0
+        self.scheduler = MeasurementScheduler(self.sendCommand)
+        # shadow state of the scope, see sendCommand
+        self.state = {}
+        self.queries = {}
+        self.panel = None
+        self.acquiring = False
+        self.sent = 0
+        self.suppressed = 0
+        self.retried = 0
+
+    def report(self, message):
+        if self.status is not None:
+            self.status(message)
+        else:
+            log.warning(message)
+
+    @locked
+    def open(self):
+        if not self.serial_port:
+            try:
+                self.serial_port = serial.Serial(self.port,
+                                                baudrate=115200,
+                                                parity=serial.PARITY_NONE,
+                                                stopbits=serial.STOPBITS_ONE,
+                                                rtscts=True,
+                                                timeout=POLL_INTERVAL)
+                self.reader = SerialBuffer(self.serial_port)
+            except serial.SerialException:
+                raise Exception("Couln't open the serial port " + self.port)
+            self.invalidate()
+
+    @locked
+    def close(self):
+        self.invalidate()
+        if self.serial_port:
+            self.serial_port.close()
+            self.serial_port = None
+            self.reader = None
+
+    def invalidate(self):
+        """Forget the shadow state, the next commands are all sent."""
+        self.state.clear()
+        self.queries.clear()
+        self.panel = None
+
+    def forgetPanel(self):
+        """Forget the settings the front panel can change."""
+        for name in list(self.state):
+            if name not in REMOTE_SETTINGS:
+                del self.state[name]
+        self.queries.clear()
+
+    def checkPanel(self):
+        if self.panel_query is None:
+            self.forgetPanel()
+            return
+        reply = self._sendCommand(self.panel_query)
+        if reply != self.panel:
+            self.invalidate()
+            self.panel = reply
+
+    def cached(self, name):
+        """True if the shadow state of setting name can be trusted."""
+        return self.acquiring or self.panel_query is not None or name in REMOTE_SETTINGS
+
+    @locked
+    def sendCommand(self, cmd):
+        """Like _sendCommand but skips settings that already have the value
+        and answers CACHED_QUERIES from the cache."""
+        if cmd in self.queries and self.cached(cmd):
+            self.suppressed += 1
+            return self.queries[cmd]
+        name, _, value = cmd.partition(' ')
+        if name in CACHED_SETTINGS and self.cached(name) and self.state.get(name) == value:
+            self.suppressed += 1
+            return 'ack'
+        reply = self._sendCommand(cmd)
+        if name in INVALIDATING:
+            self.invalidate()
+        elif reply is None:
+            # nack or timeout: the value is unknown
+            self.state.pop(name, None)
+        elif cmd in CACHED_QUERIES:
+            self.queries[cmd] = reply
+        elif name in CACHED_SETTINGS:
+            self.state[name] = value
+            self.queries.pop(name + '?', None)
+        return reply
+
+    def _transaction(self, cmd, read):
+        """Send cmd and return read() after the ack, or None after a nack or
+        when every attempt failed."""
+        self.sent += 1
+        log.debug('command: %s', cmd)
+        try:
+            self.open()
+        except Exception as e:
+            self.report(str(e))
+            return
+        name = cmd.partition(' ')[0]
+        self.reader.timeout = TIMEOUTS.get(name, DEFAULT_TIMEOUT)
+        start = time.time()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+            self.reader.start_transfer()
+            self.serial_port.write(str(cmd) + '\r\n')
+            try:
+                if self.reader.readline() != 'ack':
+                    self.report('nack')
+                    return
+                reply = read()
+            except (serial.SerialException, ValueError) as e:
+                # timeout or garbled reply: drop the rest and try again
+                self.report('%s: %s' % (cmd, e))
+                self.reader.resync()
+                continue
+            self.throughput = self.reader.throughput()
+            profiler.add('command ' + name, time.time() - start)
+            profiler.add('bytes ' + name, self.reader.transfer_bytes)
+            return reply
+        self.report('%s: no reply after %d attempts' % (cmd, self.retries + 1))
+
+    @locked
+    def _sendCommand(self, cmd):
+        def read():
+            if str(cmd)[-1] == '?':
+                return self.reader.readline().strip('\r\n')
+            return 'ack'
+        return self._transaction(cmd, read)
+
+    # binary data comes as a definite length block: #<n><length><data>\r\n
+    #   n: number of digits of length
+    #   length: number of data bytes
+    @locked
+    def _sendBinaryQuery(self, cmd):
+        def read():
+            header = self.reader.read(2)
+            if header[0] != '#' or not header[1].isdigit():
+                raise ValueError('bad block header: %r' % header)
+            length = int(self.reader.read(int(header[1])))
+            data = self.reader.read(length)
+            self.reader.readline() # trailing \r\n
+            return data
+        return self._transaction(cmd, read)
+
+    def setDataFormat(self, binary):
+        if binary and self.sendCommand('DTFORM BIN') is not None:
+            return True
+        self.sendCommand('DTFORM ASC')
+        return False
+
+    def timebase(self):
+        """Return the time/div (the screen has 10 divisions)."""
+        reply = self.sendCommand('TDIV?')
+        try:
+            return float(reply)
+        except (TypeError, ValueError):
+            raise InstrumentError('Bad TDIV? reply: %r' % reply)
+
+    def acquireWave(self, channel, interval):
+        """Return the Waveform of channel ('C1' or 'C2') sampled at interval."""
+        self.sendCommand('%s:TRA ON' % channel)
+        self.sendCommand('WAVESRC CH%s' % channel[-1])
+        if self.binary:
+            data = self._sendBinaryQuery('DTWAVE?')
+            if data is not None:
+                with profiler.timer('parse'):
+                    raw = parseBinary(data)
+                return Waveform(raw, interval, 'CH%s' % channel[-1])
+            # fall back to ascii for the rest of this acquisition: the scope
+            # must be told, or it keeps sending binary blocks
+            self.binary = self.setDataFormat(False)
+            if self.points > ASCII_POINTS:
+                interval *= float(self.points) / ASCII_POINTS
+                self.points = ASCII_POINTS
+                self.sendCommand('DTPOINTS %d' % self.points)
+        reply = self._sendCommand('DTWAVE?')
+        if reply is None:
+            raise InstrumentError('No waveform from %s' % channel)
+        with profiler.timer('parse'):
+            raw = parseAscii(reply)
+        return Waveform(raw, interval, 'CH%s' % channel[-1])
+
+    @locked
+    def fetchWave(self, channel, start, stop, points=None):
+        """Transfer points samples (by default all) of the record range
+        [start, stop) of channel without a new acquisition, e.g. to show a
+        zoomed range at full resolution after a preview."""
+        if not self.ranges:
+            raise InstrumentError('The scope has no %s command' % RANGE_COMMAND)
+        if points is None:
+            points = stop - start
+        interval = (self.timebase() * 10) / self.record * (stop - start) / points
+        if self.sendCommand('%s %d,%d' % (RANGE_COMMAND, start, stop)) is None:
+            # don't try again: DTWAVE? would spread points over the whole
+            # record instead of the range
+            self.ranges = False
+            self.range = None
+            raise InstrumentError('%s %d,%d failed' % (RANGE_COMMAND, start, stop))
+        self.range = (start, stop)
+        self.sendCommand('DTPOINTS %d' % points)
+        self.points = points
+        return self.acquireWave('C%s' % channel[-1], interval)
+
+    def measure(self, channel, mode):
+        return self.scheduler.run([(channel, mode)])[(channel, mode)]
+
+    def hostMeasurements(self, requests, waves, interval, thresholds=hostmeasure.THRESHOLDS):
+        """Measure requests on the host with thresholds (see
+        hostmeasure.THRESHOLDS), in the format of the scope replies."""
+        results = {}
+        for channel in ('CH1', 'CH2'):
+            modes = [mode for ch, mode in requests if ch == channel and mode != 'SKEW']
+            if modes:
+                values = hostmeasure.measure(waves[channel].volts, interval, modes,
+                                             thresholds['level'], thresholds['low'],
+                                             thresholds['high'], thresholds['base'])
+                for mode, value in values.items():
+                    results[(channel, mode)] = value
+        if ('CH1', 'SKEW') in requests:
+            level1, edge1, level2, edge2 = thresholds['skew']
+            results[('CH1', 'SKEW')] = hostmeasure.skew(waves['CH1'].volts, waves['CH2'].volts,
+                                                        interval, level1, thresholds['base'],
+                                                        (edge1, edge2), level2)
+        # same format as the replies of the scope ('---' means still
+        # measuring, '***' that it can't be measured)
+        for key, value in results.items():
+            results[key] = '%.4e' % value if value is not None else '***'
+        return results
+
+    @locked
+    def acquire(self, settings):
+        """Acquire the waveforms and measurements of one frame.
+
+        settings is a dict with:
+          channels: list of channels to acquire ('CH1', 'CH2')
+          binary: try binary transfers
+          longmem: use the long memory
+          bwl, coupling: dicts channel -> bandwidth limit on/off, coupling
+          measurements: list of (channel, mode) to measure
+          host: compute the measurements on the host
+          thresholds: of the host measurements (see hostmeasure.THRESHOLDS)
+          preview: if set, transfer only this many samples spread over the
+            record (see fetchWave for the rest)
+        """
+        self.acquiring = True
+        try:
+            return self._acquire(settings)
+        finally:
+            self.acquiring = False
+
+    def _acquire(self, settings):
+        start = time.time()
+        self.checkPanel()
+        # binary transfers fall back to ascii if the scope rejects them
+        self.binary = self.setDataFormat(settings['binary'])
+
+        if settings['longmem']:
+            self.sendCommand('MLEN LONG')
+            record = RECORD['LONG']
+            if self.binary:
+                points = 102400
+            else:
+                points = ASCII_POINTS
+        else:
+            self.sendCommand('MLEN SHORT')
+            record = RECORD['SHORT']
+            points = 5120
+        if settings.get('preview'):
+            points = min(points, settings['preview'])
+        if self.range is not None:
+            # back to the whole record after fetchWave
+            self.sendCommand('%s 0,%d' % (RANGE_COMMAND, record))
+            self.range = None
+        self.sendCommand('DTPOINTS ' + str(points))
+        self.points = points
+
+        self.record = record
+        tdiv = self.timebase() # time/div (total: 10 div)
+        interval = (tdiv * 10) / points # sample_rate = 1/interval
+
+        waves = {}
+        throughput = 0.0
+        for channel in settings['channels']:
+            self.setBandwidthLimit(channel, settings['bwl'][channel])
+            waves[channel] = self.acquireWave('C%s' % channel[-1], interval)
+            throughput = self.throughput
+        if self.points != points:
+            # a binary transfer failed and the rest went in ascii with fewer
+            # points: transfer again the channels that came before it
+            points = self.points
+            interval = (tdiv * 10) / points
+            for channel in settings['channels']:
+                if len(waves[channel]) != points:
+                    waves[channel] = self.acquireWave('C%s' % channel[-1], interval)
+
+        # LEVL, MCND and SKLV set the thresholds: see hostmeasure.THRESHOLDS
+        if settings['host']:
+            with profiler.timer('measure host'):
+                results = self.hostMeasurements(settings['measurements'], waves, interval,
+                                                settings.get('thresholds', hostmeasure.THRESHOLDS))
+        else:
+            with profiler.timer('measure instrument'):
+                results = self.scheduler.run(settings['measurements'])
+        profiler.add('acquire', time.time() - start)
+
+        return {
+            'time': time.time(),
+            'channels': settings['channels'],
+            'points': points,
+            'record': record,
+            'record_interval': (tdiv * 10) / record,
+            'tdiv': tdiv,
+            'interval': interval,
+            'coupling': dict((ch, settings['coupling'][ch]) for ch in settings['channels']),
+            'bwl': dict((ch, settings['bwl'][ch]) for ch in settings['channels']),
+            'waves': waves,
+            'measurements': results,
+            'throughput': throughput,
+            'sent': self.sent,
+            'suppressed': self.suppressed,
+            'retried': self.retried,
+        }
+
+    def setChannel(self, channel, on):
+        return self.sendCommand('C%s:TRA %s' % (channel[-1], 'ON' if on else 'OFF'))
+
+    def setCoupling(self, channel, coupling):
+        return self.sendCommand('C%s:CPL %s' % (channel[-1], coupling))
+
+    def setBandwidthLimit(self, channel, on):
+        return self.sendCommand('C%s:BWL %s' % (channel[-1], 'ON' if on else 'OFF'))
+
+    def setPersistence(self, on):
+        return self.sendCommand('PERS %s' % ('ON' if on else 'OFF'))
+
+    def setEquivalentTime(self, on):
+        return self.sendCommand('EQU %s' % ('ON' if on else 'OFF'))
+
+    def aset(self):
+        return self.sendCommand('ASET')
+
+def defaultSettings(channels=('CH1',)):
+    """Acquisition settings with every measurement of channels."""
+    channels = list(channels)
+    requests = [(channel, mode) for channel in channels for label, mode in MEASUREMENTS]
+    if len(channels) == 2:
+        requests.append(('CH1', 'SKEW'))
+    return {
+        'channels': channels,
+        'binary': True,
+        'longmem': False,
+        'bwl': {'CH1': False, 'CH2': False},
+        'coupling': {'CH1': None, 'CH2': None},
+        'preview': None,
+        'measurements': requests,
+        'thresholds': dict(hostmeasure.THRESHOLDS),
+        'host': False,
+    }
@@ -26,6 +26,7 @@
 #   DATE?
 
 import sys
+import logging
 import numpy as np
 from PyQt4 import QtGui, QtCore
 import matplotlib
@@ -34,11 +35,36 @@ from matplotlib.backends.backend_qt4agg import (
     FigureCanvasQTAgg as FigureCanvas,
     NavigationToolbar2QT as NavigationToolbar)
 from window import Ui_MainWindow
-import serial
+from instrument import Instrument
+from scheduler import MEASUREMENTS
+from frames import FrameRing
+from worker import AcquisitionWorker
+from plotting import PlotManager, colorize
+from recorder import Recording
+from spectrum import SpectrumEngine
+from pool import ScopePool, PoolRecording
+from accumulator import FrameAccumulator
+from masks import MaskTester
+from mathchannels import MathEngine
+from segments import SegmentCache
+from commandqueue import CommandQueue
+from profiling import profiler
 import glob
-import time
+
+log = logging.getLogger(__name__)
+
+# samples transferred by a preview acquisition
+PREVIEW_POINTS = 1024
+# zoomed ranges wider than this keep showing the preview (8192 samples take
+# about 1.5 s to transfer at 115200 baud)
+MAX_ZOOM_SAMPLES = 8192
 
 class Main(QtGui.QMainWindow, Ui_MainWindow):
+    status = QtCore.pyqtSignal(str)
+    # results of the command queue, emitted from its thread
+    frameAcquired = QtCore.pyqtSignal(object)
+    zoomFetched = QtCore.pyqtSignal(object, object, int)
+
     def __init__(self):
         super(Main, self).__init__()
         self.setupUi(self)
@@ -52,77 +78,298 @@ class Main(QtGui.QMainWindow, Ui_MainWindow):
         self.toolbar = NavigationToolbar(self.canvas,
                 self.matplot_widget, coordinates=True)
         self.matplot_vlayout.addWidget(self.toolbar)
+        self.plot = PlotManager(self.canvas, self.ax1f1)
         self.ch1_wave = None
         self.ch2_wave = None
         self.interval = None
         self.points = None
+        self.settings = None
+        self.frame = None
+        self.spectrum = SpectrumEngine()
+        self.view = 'time'
 
         # prepare the serial port combo
         serial_list = sorted(glob.glob('/dev/ttyUSB*'), key = lambda x: int(x[11:]))
         serial_list += sorted(glob.glob('/dev/ttyACM*'), key = lambda x: int(x[11:]))
         serial_list += sorted(glob.glob('/dev/ttyS*'), key = lambda x: int(x[9:]))[:5]
         self.serial_combo.addItems(serial_list)
-        self.serial_port = None
+        self.instrument = None
+
+        # selecting several scopes acquires them together (see pool.py)
+        self.pool_menu = QtGui.QMenu(self)
+        self.pool_actions = []
+        for port in serial_list:
+            action = self.pool_menu.addAction(port)
+            action.setCheckable(True)
+            self.pool_actions.append(action)
+        self.pool_button.setMenu(self.pool_menu)
+        self.pool = None
+
+        # prepare the measurements menu
+        self.measure_menu = QtGui.QMenu(self)
+        self.measure_actions = {}
+        for label, mode in MEASUREMENTS + [('SKEW', 'SKEW')]:
+            action = self.measure_menu.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(True)
+            self.measure_actions[mode] = action
+        self.measure_button.setMenu(self.measure_menu)
+
+        # continuous acquisition
+        self.frames = FrameRing()
+        self.worker = None
+        self.recording = None
+        # host-side averaging and persistence of the frames
+        self.accumulator = FrameAccumulator()
+        # pass/fail mask test of the frames (see masks.py)
+        self.masks = MaskTester()
+        self.failures = None
+        # math channels and cross-correlation (see mathchannels.py)
+        self.math = MathEngine()
+        self.mask_menu = QtGui.QMenu(self)
+        self.mask_menu.addAction('From current frame...', self.maskFromFrame)
+        self.mask_menu.addAction('Load...', self.loadMask)
+        self.mask_menu.addAction('Save...', self.saveMask)
+        self.failures_action = self.mask_menu.addAction('Save failures to...')
+        self.failures_action.setCheckable(True)
+        self.failures_action.toggled.connect(self.failures_toggled)
+        self.mask_menu.addAction('Clear counts', self.masks.clear)
+        self.mask_menu.addAction('Remove', self.removeMask)
+        self.mask_button.setMenu(self.mask_menu)
+        # full resolution of the zoomed range of a preview frame
+        self.preview = None
+        self.segments = None
+        self.zoom_timer = QtCore.QTimer(self)
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.setInterval(200)
+        self.zoom_timer.timeout.connect(self.fetchZoom)
+        self.ax1f1.callbacks.connect('xlim_changed', self.zoomChanged)
+        # widgets that talk to the scope while the worker owns the port
+        self.command_widgets = [self.acquire_button, self.single_button,
+                                self.autoset_button,
+                                self.ch1_checkbox, self.ch2_checkbox,
+                                self.ch1_coupling_combo, self.ch2_coupling_combo,
+                                self.persist_checkbox, self.equiv_checkbox,
+                                self.record_checkbox, self.pool_button]
+        self.status.connect(self.showStatus)
+        # commands run on their own thread so the GUI never waits for the port
+        self.commands = CommandQueue()
+        self.frameAcquired.connect(self.showAcquired)
+        self.zoomFetched.connect(self.showZoom)
+
+        # live timings of the acquisition (see profiling.py)
+        self.profile_label = QtGui.QLabel(self)
+        self.statusBar.addPermanentWidget(self.profile_label)
+        self.profile_timer = QtCore.QTimer(self)
+        self.profile_timer.timeout.connect(self.showProfile)
+        self.profile_timer.start(1000)
+        self.profile_menu = QtGui.QMenu(self)
+        self.profile_menu.addAction('Export JSON...', self.exportProfileJson)
+        self.profile_menu.addAction('Export CSV...', self.exportProfileCsv)
+        self.profile_menu.addAction('Clear', profiler.clear)
+        self.profile_button.setMenu(self.profile_menu)
+
+    def poolPorts(self):
+        return [str(action.text()) for action in self.pool_actions if action.isChecked()]
 
     def check_serial_port(self):
-        if not self.serial_port:
-            port = str(self.serial_combo.currentText())
-            try:
-                self.serial_port = serial.Serial(port,
-                                                baudrate=115200,
-                                                parity=serial.PARITY_NONE,
-                                                stopbits=serial.STOPBITS_ONE,
-                                                rtscts=True,
-                                                timeout=30.0)
-                self.serial_combo.setEnabled(False)
-            except serial.SerialException:
-                raise Exception("Couln't open the serial port " + port)
-
-    # \n  ASCII Linefeed (LF)
-    # \r    ASCII Carriage Return (CR)
-    def readlineCR(self):
-        rv = ""
-        while True:
-            ch = self.serial_port.read()
-            if ch == '\x06':
-                return 'ack'
-            rv += ch
-            if ch=='\n':
-                return rv
-
-    def _sendCommand(self, cmd):
-        print "command: " + cmd
+        ports = self.poolPorts()
+        if len(ports) > 1:
+            if self.pool is not None and self.pool.ports == ports:
+                return
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
+            if self.instrument is not None and self.instrument.port in ports:
+                self.instrument.close()
+                self.instrument = None
+                self.serial_combo.setEnabled(True)
+            pool = ScopePool(ports, status=self.status.emit)
+            pool.open()
+            self.pool = pool
+            return
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        if not self.instrument:
+            instrument = Instrument(str(self.serial_combo.currentText()),
+                                    status=self.status.emit)
+            instrument.open()
+            self.instrument = instrument
+            self.serial_combo.setEnabled(False)
+
+    def scope(self):
+        """Return the instrument (or the pool of scopes), opening the serial
+        ports if needed."""
         try:
             self.check_serial_port()
         except Exception as e:
-            self.statusBar.clearMessage()
-            self.statusBar.showMessage(str(e))
+            self.showStatus(str(e))
             return
-        self.serial_port.write(str(cmd) + '\r\n')
-        reply = self.readlineCR()
-        if reply != 'ack':
-            self.statusBar.clearMessage()
-            self.statusBar.showMessage('nack')
+        if self.pool is not None:
+            return self.pool
+        return self.instrument
+
+    def selectedMeasurements(self, channels):
+        requests = []
+        for channel in channels:
+            for label, mode in MEASUREMENTS:
+                if self.measure_actions[mode].isChecked():
+                    requests.append((channel, mode))
+        # skew is the same for both channels so measure it once
+        if len(channels) == 2 and self.measure_actions['SKEW'].isChecked():
+            requests.append(('CH1', 'SKEW'))
+        return requests
+
+    def showMeasurements(self, textedit, names, results):
+        # names are 'CH1' or, for a pool, '<scope>:CH1' for each scope
+        textedit.clear()
+        for name in names:
+            scope, sep, channel = name.rpartition(':')
+            if scope:
+                textedit.appendPlainText('%s:' % scope)
+            for label, mode in MEASUREMENTS:
+                if (name, mode) in results:
+                    textedit.appendPlainText('%s: %s' % (label, results[(name, mode)]))
+            if (scope + sep + 'CH1', 'SKEW') in results:
+                textedit.appendPlainText('SKEW: %s' % results[(scope + sep + 'CH1', 'SKEW')])
+
+    def poolErrors(self, frame):
+        # scopes of a pool that failed this frame
+        errors = frame.get('errors')
+        if not errors:
+            return ''
+        return ' ' + ', '.join('%s: %s' % item for item in sorted(errors.items()))
+
+    def accumulated(self):
+        if not self.accumulator.enabled:
+            return ''
+        return ', %d accumulated' % self.accumulator.count()
+
+    def maskStatus(self):
+        if not self.masks.enabled:
+            return ''
+        summary = self.masks.summary()
+        return ', mask: %d/%d failed (%d glitches, %d runts)' % (
+            summary['failed'], summary['frames'], summary['glitches'], summary['runts'])
+
+    def mathCurves(self, curves):
+        """Add the math channels of the last frame to the curves of the time
+        view."""
+        if not self.math.channels or self.frame is None:
+            return curves
+        times, results = self.math.compute(self.frame)
+        for name, samples in results.items():
+            curves[name] = (times[:len(samples)], samples)
+        return curves
+
+    def showCorrelation(self, frame):
+        correlation = self.math.correlate(frame)
+        if correlation is None:
             return
-        if str(cmd)[-1] == '?':
-            reply = self.readlineCR()
-        return reply.strip('\r\n')
-
-    def acquireWave(self, channel):
-        self._sendCommand('%s:TRA ON' % channel)
-        self._sendCommand('WAVESRC CH%s' % channel[-1])
-        reply = self._sendCommand('DTWAVE?')
-        # ascii data comes in 0.1mv format
-        wave = [float(item)/10000.0 for item in reply.split(',')]
-        return wave
-
-    def measure(self, channel, mode):
-        self._sendCommand('DIRM A')
-        self._sendCommand('MSEL %s, %s' % (channel, mode))
-        time.sleep(1)
-        return self._sendCommand('MSRA?')
-
-    def Acquire(self, show_plot=True):
+        delay, phase, frequency, coefficient = correlation
+        self.ch2_measure_textedit.appendPlainText('Delay: %.4e' % delay)
+        self.ch2_measure_textedit.appendPlainText('Phase: %.1f deg at %.4e Hz' % (phase, frequency))
+        self.ch2_measure_textedit.appendPlainText('Correlation: %.3f' % coefficient)
+
+    def maskCurves(self, curves):
+        """Add the upper and lower limits of the masks to the curves of the
+        time view."""
+        if not self.masks.enabled:
+            return curves
+        for name, (times, upper, lower) in self.masks.envelopes().items():
+            if name in curves:
+                curves[name + ' upper'] = (times, upper)
+                curves[name + ' lower'] = (times, lower)
+        return curves
+
+    def showStatus(self, message):
+        self.statusBar.clearMessage()
+        self.statusBar.showMessage(message)
+
+    def acquireSettings(self):
+        """Snapshot of the widgets used by Instrument.acquire."""
+        channels = []
+        if self.ch1_checkbox.isChecked():
+            channels.append('CH1')
+        if self.ch2_checkbox.isChecked():
+            channels.append('CH2')
+        return {
+            'channels': channels,
+            'binary': self.binary_checkbox.isChecked(),
+            'longmem': self.longmem_checkbox.isChecked(),
+            'bwl': {'CH1': self.ch1_lpfilter_checkbox.isChecked(),
+                    'CH2': self.ch2_lpfilter_checkbox.isChecked()},
+            'coupling': {'CH1': str(self.ch1_coupling_combo.currentText()),
+                         'CH2': str(self.ch2_coupling_combo.currentText())},
+            'measurements': self.selectedMeasurements(channels),
+            'host': str(self.measure_mode_combo.currentText()) == 'Host',
+            'preview': PREVIEW_POINTS if self.preview_checkbox.isChecked() else None,
+        }
+
+    def showFrame(self, frame, show_plot=True):
+        self.frame = frame
+        self.points = frame['points']
+        self.interval = frame['interval']
+        if (self.pool is None and self.instrument is not None and self.instrument.ranges and
+                frame.get('record', frame['points']) > frame['points']):
+            self.preview = frame
+            self.segments = SegmentCache(self.instrument.fetchWave, frame['record'])
+        else:
+            self.preview = None
+            self.segments = None
+
+        # the spectrum view uses the first scope of a pool
+        channels = []
+        for channel, textedit in (('CH1', self.ch1_measure_textedit),
+                                  ('CH2', self.ch2_measure_textedit)):
+            names = [name for name in frame['channels']
+                     if name.rpartition(':')[2] == channel]
+            if not names:
+                continue
+            if channel == 'CH1':
+                self.ch1_wave = frame['waves'][names[0]]
+            else:
+                self.ch2_wave = frame['waves'][names[0]]
+            channels.append(channel)
+            self.showMeasurements(textedit, names, frame['measurements'])
+        if len(channels) == 2:
+            self.showCorrelation(frame)
+
+        if show_plot:
+            if self.view == 'fft':
+                self.showSpectrum(channels)
+            elif self.accumulator.enabled and self.showAccumulated():
+                pass
+            else:
+                # each Waveform has its own interval (scopes of a pool)
+                curves = dict((name, (wave.times(), wave.volts))
+                              for name, wave in frame['waves'].items())
+                self.plot.update('time', None, self.maskCurves(self.mathCurves(curves)))
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the command queue and return its Future. Errors
+        are shown in the status bar."""
+        future = self.commands.submit(fn, *args)
+        future.add_done_callback(self.commandDone)
+        return future
+
+    def commandDone(self, future):
+        # runs on the command queue thread
+        if future.exception() is not None:
+            self.status.emit('Command failed: %s' % future.exception())
+
+    def replyDone(self, future):
+        # runs on the command queue thread
+        if future.exception() is None and future.result() is not None:
+            self.status.emit(future.result())
+
+    def acquireDone(self, future):
+        # runs on the command queue thread
+        if future.exception() is None:
+            self.frameAcquired.emit(future.result())
+
+    def Acquire(self):
         self.statusBar.clearMessage()
         if not (self.ch1_checkbox.isChecked() or self.ch2_checkbox.isChecked()):
             self.statusBar.showMessage('Both channels are disabled')
@@ -130,135 +377,225 @@ class Main(QtGui.QMainWindow, Ui_MainWindow):
         else:
             self.statusBar.showMessage('Acquiring...')
 
-        if self.longmem_checkbox.isChecked():
-            self._sendCommand('MLEN LONG')
-            # TODO: it should work with points = 102400 but it takes too long (try using binary data)
-            self.points = 30000
-        else:
-            self._sendCommand('MLEN SHORT')
-            self.points = 5120
-        self._sendCommand('DTPOINTS ' + str(self.points))
-
-        tdiv = float(self._sendCommand('TDIV?')) # time/div (total: 10 div)
-        self.interval = (tdiv * 10) / self.points # sample_rate = 1/interval
-        x = np.arange(0, self.interval * self.points, self.interval)
+        scope = self.scope()
+        if scope is None:
+            return
+        self.settings = self.acquireSettings()
+        self.submit(scope.acquire, self.settings).add_done_callback(self.acquireDone)
+
+    def showAcquired(self, frame):
+        if self.recording is not None:
+            self.recording.append(frame)
+        self.accumulator.add(frame)
+        self.masks.add(frame)
+        self.showFrame(frame)
+        self.statusBar.clearMessage()
+        self.statusBar.showMessage('Acquiring... FINISHED (%.1f kB/s, %d commands sent, %d suppressed)%s%s%s' %
+                                   (frame['throughput'] / 1000.0, frame['sent'], frame['suppressed'],
+                                    self.accumulated(), self.maskStatus(), self.poolErrors(frame)))
 
-        if show_plot:
-            self.ax1f1.clear()
-            self.ax1f1.set_xlim([0, max(x)])
+    def startWorker(self, count):
+        if not (self.ch1_checkbox.isChecked() or self.ch2_checkbox.isChecked()):
+            self.showStatus('Both channels are disabled')
+            self.run_button.setChecked(False)
+            return
+        # open the port here, the worker owns it until it finishes
+        scope = self.scope()
+        if scope is None:
+            self.run_button.setChecked(False)
+            return
+        for widget in self.command_widgets:
+            widget.setEnabled(False)
+        if count is not None:
+            self.run_button.setEnabled(False)
+        self.showStatus('Running...')
+        self.settings = self.acquireSettings()
+        self.worker = AcquisitionWorker(scope.acquire, self.settings,
+                                        self.frames, count, recording=self.recording,
+                                        accumulator=self.accumulator, masks=self.masks,
+                                        parent=self)
+        self.worker.frameReady.connect(self.frameReady)
+        self.worker.failed.connect(self.showStatus)
+        self.worker.finished.connect(self.workerFinished)
+        self.worker.start()
+
+    def run_toggled(self):
+        if self.run_button.isChecked():
+            self.run_button.setText('Stop')
+            self.startWorker(None)
+        else:
+            self.run_button.setText('Run')
+            if self.worker is not None:
+                self.worker.stop()
 
-        if self.ch1_checkbox.isChecked():
-            if self.ch1_lpfilter_checkbox.isChecked():
-                self._sendCommand('C1:BWL ON')
-            else:
-                self._sendCommand('C1:BWL OFF')
-            self.ch1_wave = self.acquireWave('C1')
-            if show_plot:
-                self.ax1f1.plot(x, self.ch1_wave)
-            period   = self.measure('CH1', 'PERIOD')
-            duty     = self.measure('CH1', 'DUTY')
-            vmean    = self.measure('CH1', 'VMEAN')
-            freq     = self.measure('CH1', 'FREQ')
-            vrms     = self.measure('CH1', 'VRMS')
-            vpp      = self.measure('CH1', 'P-P')
-            tr       = self.measure('CH1', 'TR')
-            tf       = self.measure('CH1', 'TF')
-            pos_pw   = self.measure('CH1', '+PW')
-            neg_pw   = self.measure('CH1', '-PW')
-            pos_peak = self.measure('CH1', '+PEAK')
-            neg_peak = self.measure('CH1', '-PEAK')
-            self.ch1_measure_textedit.clear()
-            self.ch1_measure_textedit.appendPlainText('Period: %s' % period)
-            self.ch1_measure_textedit.appendPlainText('Duty: %s' % duty)
-            self.ch1_measure_textedit.appendPlainText('Vmean: %s' % vmean)
-            self.ch1_measure_textedit.appendPlainText('Freq: %s' % freq)
-            self.ch1_measure_textedit.appendPlainText('Vrms: %s' % vrms)
-            self.ch1_measure_textedit.appendPlainText('Vpp: %s' % vpp)
-            self.ch1_measure_textedit.appendPlainText('Rise: %s' % tr)
-            self.ch1_measure_textedit.appendPlainText('Fall: %s' % tf)
-            self.ch1_measure_textedit.appendPlainText('+PW: %s' % pos_pw)
-            self.ch1_measure_textedit.appendPlainText('-PW: %s' % neg_pw)
-            self.ch1_measure_textedit.appendPlainText('+PEAK: %s' % pos_peak)
-            self.ch1_measure_textedit.appendPlainText('-PEAK: %s' % neg_peak)
-
-            #v_at_t = self._sendCommand('CURM V_AT_T')
-            #self.ch1_measure_textedit.appendPlainText('Vcursor: %s' % v_at_t)
-
-            #hcur1, hcur2 = self._sendCommand('HCUR?').split(',')
-            #vcur1, vcur2 = self._sendCommand('VCUR?').split(',')
-
-
-#  <-- low pass filter
-# PROBE mode value (mode: AUTO, MANUAL value: 1,10,100,1000 (1:1 10:1 ...)
-# AVGCNT 2..256 (requires AVERAGE mode <--
-
-#LEVL 10~90
-    #Used by: FREQ, PERIOD, +PW, -PW, and DUTY
-#MCND base, 11-90, 10-89
-    #base: T-B or P-P
-    #Used by: TR and TF
-#SKLV ch1-level>, <ch1_edge>, <ch2_level>, <ch2_edge> (RISE or FALL)
-    #Used by: SKEW
+    def single(self):
+        self.startWorker(1)
 
-        if self.ch2_checkbox.isChecked():
-            if self.ch2_lpfilter_checkbox.isChecked():
-                self._sendCommand('C2:BWL ON')
+    def frameReady(self):
+        waves, frame = self.frames.latest()
+        if frame is None:
+            return
+        frame = dict(frame, waves=dict(zip(frame['channels'], waves)))
+        self.showFrame(frame)
+        self.showStatus('Running... frame %d (%.1f kB/s, %d dropped)%s%s%s' %
+                        (self.frames.total, frame['throughput'] / 1000.0, self.frames.dropped,
+                         self.accumulated(), self.maskStatus(), self.poolErrors(frame)))
+
+    def workerFinished(self):
+        self.worker = None
+        for widget in self.command_widgets + [self.run_button]:
+            widget.setEnabled(True)
+        self.pool_button.setEnabled(self.recording is None)
+        self.run_button.setChecked(False)
+
+    def record_toggled(self):
+        if self.record_checkbox.isChecked():
+            path = QtGui.QFileDialog.getExistingDirectory(self, 'Record frames to')
+            if not path:
+                self.record_checkbox.setChecked(False)
+                return
+            ports = self.poolPorts()
+            if len(ports) > 1:
+                self.recording = PoolRecording(str(path), ports)
             else:
-                self._sendCommand('C2:BWL OFF')
-            self.ch2_wave = self.acquireWave('C2')
-            if show_plot:
-                self.ax1f1.plot(x, self.ch2_wave)
-            period   = self.measure('CH2', 'PERIOD')
-            duty     = self.measure('CH2', 'DUTY')
-            vmean    = self.measure('CH2', 'VMEAN')
-            freq     = self.measure('CH2', 'FREQ')
-            vrms     = self.measure('CH2', 'VRMS')
-            vpp      = self.measure('CH2', 'P-P')
-            tr       = self.measure('CH2', 'TR')
-            tf       = self.measure('CH2', 'TF')
-            pos_pw   = self.measure('CH2', '+PW')
-            neg_pw   = self.measure('CH2', '-PW')
-            pos_peak = self.measure('CH2', '+PEAK')
-            neg_peak = self.measure('CH2', '-PEAK')
-            self.ch2_measure_textedit.clear()
-            self.ch2_measure_textedit.appendPlainText('Period: %s' % period)
-            self.ch2_measure_textedit.appendPlainText('Duty: %s' % duty)
-            self.ch2_measure_textedit.appendPlainText('Vmean: %s' % vmean)
-            self.ch2_measure_textedit.appendPlainText('Freq: %s' % freq)
-            self.ch2_measure_textedit.appendPlainText('Vrms: %s' % vrms)
-            self.ch2_measure_textedit.appendPlainText('Vpp: %s' % vpp)
-            self.ch2_measure_textedit.appendPlainText('Rise: %s' % tr)
-            self.ch2_measure_textedit.appendPlainText('Fall: %s' % tf)
-            self.ch2_measure_textedit.appendPlainText('+PW: %s' % pos_pw)
-            self.ch2_measure_textedit.appendPlainText('-PW: %s' % neg_pw)
-            self.ch2_measure_textedit.appendPlainText('+PEAK: %s' % pos_peak)
-            self.ch2_measure_textedit.appendPlainText('-PEAK: %s' % neg_peak)
-
-        if self.ch1_checkbox.isChecked() and self.ch2_checkbox.isChecked():
-            skew = self.measure('CH1', 'SKEW')
-            self.ch1_measure_textedit.appendPlainText('SKEW: %s' % skew)
-            # Note: should be equal
-            skew = self.measure('CH2', 'SKEW')
-            self.ch2_measure_textedit.appendPlainText('SKEW: %s' % skew)
-
-        if show_plot:
-            self.canvas.draw()
-        self.statusBar.clearMessage()
-        self.statusBar.showMessage('Acquiring... FINISHED')
-
-    def fft(self, wave):
-        Fk = np.fft.fft(wave)/self.points # Fourier coefficients (divided by n)
-        nu = np.fft.fftfreq(self.points, self.interval) # Natural frequencies
-        Fk = np.fft.fftshift(Fk) # Shift zero freq to center
-        nu = np.fft.fftshift(nu) # Shift zero freq to center
-        return Fk, nu
-
-    def rfft(self, wave):
-        Fk = np.fft.rfft(wave)/self.points
-        nu = np.fft.rfftfreq(self.points, self.interval)
-        return Fk, nu
+                self.recording = Recording(str(path))
+            # the recording is laid out for the scopes selected now
+            self.pool_button.setEnabled(False)
+            self.showStatus('Recording to %s (%d frames)' % (path, len(self.recording)))
+        elif self.recording is not None:
+            self.recording.close()
+            self.showStatus('Recorded %d frames' % len(self.recording))
+            self.recording = None
+            self.pool_button.setEnabled(True)
+
+    def enabledChannels(self):
+        channels = []
+        if self.ch1_checkbox.isChecked() and self.ch1_wave is not None:
+            channels.append('CH1')
+        if self.ch2_checkbox.isChecked() and self.ch2_wave is not None:
+            channels.append('CH2')
+        return channels
+
+    def frameOutdated(self):
+        """True if the last frame doesn't match the current settings."""
+        if self.settings is None or not self.interval:
+            return True
+        settings = self.acquireSettings()
+        for channel in settings['channels']:
+            if channel not in self.settings['channels']:
+                return True
+        for key in ('binary', 'longmem', 'bwl'):
+            if settings[key] != self.settings[key]:
+                return True
+        return False
+
+    def showSpectrum(self, channels):
+        self.spectrum.configure(str(self.fft_window_combo.currentText()),
+                                self.fft_segments_spin.value(),
+                                str(self.fft_average_combo.currentText()))
+        spectra = {}
+        with profiler.timer('fft'):
+            for channel in channels:
+                wave = self.ch1_wave if channel == 'CH1' else self.ch2_wave
+                nu, spectra[channel] = self.spectrum.update(channel, wave.volts, wave.interval)
+        if spectra:
+            self.plot.update('fft', nu, spectra)
+
+    def zoomChanged(self, ax):
+        # wait until the user stops zooming/panning
+        if self.preview is not None:
+            self.zoom_timer.start()
+
+    def fetchZoom(self):
+        """Show the zoomed range of a preview frame at full resolution.
+
+        The samples are fetched from the scope memory in chunks that are
+        cached, so panning back doesn't transfer them again.
+        """
+        frame = self.preview
+        if (frame is None or self.worker is not None or self.view != 'time' or
+                self.accumulator.enabled or not self.instrument.ranges):
+            return
+        step = frame['record_interval']
+        xmin, xmax = self.ax1f1.get_xlim()
+        start = max(int(xmin / step), 0)
+        stop = min(int(np.ceil(xmax / step)) + 1, frame['record'])
+        if stop <= start or stop - start > MAX_ZOOM_SAMPLES:
+            return
+        # the preview is enough if it has a sample per pixel
+        if (stop - start) * frame['points'] / frame['record'] >= self.ax1f1.bbox.width:
+            return
+        future = self.submit(self.zoomCurves, frame, self.segments, start, stop)
+        future.add_done_callback(self.zoomDone)
+
+    def zoomCurves(self, frame, segments, start, stop):
+        # runs on the command queue thread: the preview with the samples
+        # [start, stop) of the record at full resolution
+        step = frame['record_interval']
+        curves = {}
+        for channel in frame['channels']:
+            y = segments.get(channel, start, stop)
+            x = np.arange(start, start + len(y)) * step
+            px = frame['waves'][channel].times()
+            py = frame['waves'][channel].volts
+            before = px < x[0]
+            after = px > x[-1]
+            curves[channel] = (np.concatenate((px[before], x, px[after])),
+                               np.concatenate((py[before], y, py[after])))
+        return frame, curves, stop - start
+
+    def zoomDone(self, future):
+        # runs on the command queue thread
+        if future.exception() is None:
+            self.zoomFetched.emit(*future.result())
+
+    def showZoom(self, frame, curves, samples):
+        # a new frame may have arrived meanwhile
+        if frame is not self.preview or self.view != 'time':
+            return
+        self.plot.replace('time', curves)
+        self.showStatus('Zoom: %d samples at full resolution (%d transferred so far)' %
+                        (samples, self.segments.fetched))
+
+    def showAccumulated(self):
+        """Draw the host-side average or persistence of the accumulated
+        channels. Return False if nothing was accumulated yet."""
+        names = self.accumulator.names()
+        if str(self.host_view_combo.currentText()) == 'Persistence':
+            layers, extent = self.accumulator.persistence(names)
+            if layers is None:
+                return False
+            self.plot.updateImage('persist', colorize(layers, names), extent)
+            return True
+        curves = {}
+        for name in names:
+            average = self.accumulator.average(name)
+            if average is not None:
+                count, interval, mean, std = average
+                curves[name] = (np.arange(len(mean)) * interval, mean)
+        if not curves:
+            return False
+        self.plot.update('time', None, curves)
+        return True
+
+    def showTime(self):
+        """Redraw the time view from the last frame."""
+        self.view = 'time'
+        if self.accumulator.enabled and self.showAccumulated():
+            return
+        channels = self.enabledChannels()
+        if channels:
+            waves = dict((ch, self.ch1_wave if ch == 'CH1' else self.ch2_wave)
+                         for ch in channels)
+            curves = dict((ch, (wave.times(), wave.volts)) for ch, wave in waves.items())
+            self.plot.update('time', None, self.maskCurves(self.mathCurves(curves)))
 
     def calculateFFT(self):
+        if not self.fft_button.isChecked():
+            self.showTime()
+            return
+
+        self.view = 'fft'
         self.statusBar.clearMessage()
         if not (self.ch1_checkbox.isChecked() or self.ch2_checkbox.isChecked()):
             self.statusBar.showMessage('Both channels are disabled')
@@ -266,62 +603,148 @@ class Main(QtGui.QMainWindow, Ui_MainWindow):
         else:
             self.statusBar.showMessage('Calculating FFT...')
 
-        if any([not self.ch1_wave, not self.ch2_wave, not self.interval, not self.points]):
-            self.Acquire(show_plot=False)
-
-        self.ax1f1.clear()
-        #self.ax1f1.set_xscale('log')
-        #self.ax1f1.set_xticks([100, 1000, 10000, 100000, 1000000, 10000000])
-        #self.ax1f1.get_xaxis().set_major_formatter(matplotlib.ticker.ScalarFormatter())
-
-        if self.ch1_checkbox.isChecked():
-            Fk, nu = self.rfft(self.ch1_wave)
-            self.ax1f1.plot(nu, 20*np.log10(np.absolute(Fk))) # Plot spectral power
-        if self.ch2_checkbox.isChecked():
-            Fk, nu = self.rfft(self.ch2_wave)
-            self.ax1f1.plot(nu, 20*np.log10(np.absolute(Fk))) # Plot spectral power
-        self.canvas.draw()
+        self.spectrum.reset()
+        # reuse the last frame unless the settings changed (the spectrum is
+        # drawn when the new frame arrives), the worker redraws the spectrum
+        # of every new frame while it runs
+        if self.worker is None and self.frameOutdated():
+            self.Acquire()
+            return
+        self.showSpectrum(self.enabledChannels())
         self.statusBar.clearMessage()
         self.statusBar.showMessage('Calculating FFT... FINISHED')
 
+    def fft_settings_changed(self):
+        if self.view == 'fft':
+            self.spectrum.reset()
+            self.showSpectrum(self.enabledChannels())
+
+    def logx_toggled(self):
+        # only the axis changes, the spectrum is not computed again
+        self.plot.setLogX('fft', self.logx_checkbox.isChecked())
+
+    def host_view_changed(self):
+        # the worker accumulates the frames while this is not 'Off'
+        self.accumulator.enabled = self.host_view_combo.currentIndex() != 0
+        if self.view == 'time':
+            self.showTime()
+
+    def accum_clear(self):
+        self.accumulator.clear()
+        if self.view == 'time':
+            self.showTime()
+
+    def math_changed(self):
+        try:
+            self.math.configure(str(self.math_edit.text()))
+        except ValueError as e:
+            self.showStatus('Math: %s' % e)
+            return
+        if self.view == 'time' and self.frame is not None:
+            self.showTime()
+
+    def maskFromFrame(self):
+        if self.frame is None:
+            self.showStatus('Acquire a golden frame first')
+            return
+        tolerance, ok = QtGui.QInputDialog.getDouble(self, 'Mask', 'Tolerance (V)',
+                                                     0.1, 0.0, 100.0, 3)
+        if not ok:
+            return
+        self.masks.setGolden(self.frame, tolerance, spread=2 * self.frame['interval'])
+        self.masks.clear()
+        if self.view == 'time':
+            self.showTime()
+
+    def loadMask(self):
+        path = QtGui.QFileDialog.getOpenFileName(self, 'Load mask', '', 'Masks (*.npz)')
+        if path:
+            self.masks.load(str(path))
+            self.masks.clear()
+            if self.view == 'time':
+                self.showTime()
+
+    def saveMask(self):
+        path = QtGui.QFileDialog.getSaveFileName(self, 'Save mask', 'mask.npz')
+        if path:
+            self.masks.save(str(path))
+
+    def failures_toggled(self, checked):
+        if checked:
+            path = QtGui.QFileDialog.getExistingDirectory(self, 'Save failing frames to')
+            if not path:
+                self.failures_action.setChecked(False)
+                return
+            ports = self.poolPorts()
+            if len(ports) > 1:
+                self.failures = PoolRecording(str(path), ports)
+            else:
+                self.failures = Recording(str(path))
+            self.masks.setOutput(self.failures, str(path))
+        elif self.failures is not None:
+            self.masks.setOutput(None, None)
+            self.failures.close()
+            self.showStatus('Saved %d frames' % len(self.failures))
+            self.failures = None
+
+    def removeMask(self):
+        self.masks.remove()
+        if self.view == 'time':
+            self.showTime()
+
+    def showProfile(self):
+        # median/p99 of the main stages
+        self.profile_label.setText(profiler.format(
+            ['acquire', 'command DTWAVE?', 'parse', 'measure wait', 'fft', 'draw', 'blit']))
+
+    def exportProfileJson(self):
+        path = QtGui.QFileDialog.getSaveFileName(self, 'Export profile', 'profile.json')
+        if path:
+            profiler.exportJson(str(path))
+
+    def exportProfileCsv(self):
+        path = QtGui.QFileDialog.getSaveFileName(self, 'Export profile', 'profile.csv')
+        if path:
+            profiler.exportCsv(str(path))
+
     def aset(self):
-        reply = self._sendCommand('ASET')
-        self.statusBar.clearMessage()
-        self.statusBar.showMessage(reply)
+        scope = self.scope()
+        if scope is None:
+            return
+        self.submit(scope.aset).add_done_callback(self.replyDone)
 
     def ch_toggled(self):
-        if self.ch1_checkbox.isChecked():
-            print 'ch1 enabled'
-            reply = self._sendCommand('C1:TRA ON')
-        else:
-            print 'ch1 disabled'
-            reply = self._sendCommand('C1:TRA OFF')
-        if self.ch2_checkbox.isChecked():
-            print 'ch2 enabled'
-            reply = self._sendCommand('C2:TRA ON')
-        else:
-            print 'ch2 disabled'
-            reply = self._sendCommand('C2:TRA OFF')
+        scope = self.scope()
+        if scope is None:
+            return
+        log.debug('ch1 %s', 'enabled' if self.ch1_checkbox.isChecked() else 'disabled')
+        self.submit(scope.setChannel, 'CH1', self.ch1_checkbox.isChecked())
+        log.debug('ch2 %s', 'enabled' if self.ch2_checkbox.isChecked() else 'disabled')
+        self.submit(scope.setChannel, 'CH2', self.ch2_checkbox.isChecked())
 
     def ch_coupling_changed(self):
-        print 'ch1 coupling: ' + str(self.ch1_coupling_combo.currentText())
-        self._sendCommand('C1:CPL ' + str(self.ch1_coupling_combo.currentText()))
-        print 'ch2 coupling: ' + str(self.ch2_coupling_combo.currentText())
-        self._sendCommand('C2:CPL ' + str(self.ch2_coupling_combo.currentText()))
+        scope = self.scope()
+        if scope is None:
+            return
+        log.debug('ch1 coupling: %s', self.ch1_coupling_combo.currentText())
+        self.submit(scope.setCoupling, 'CH1', str(self.ch1_coupling_combo.currentText()))
+        log.debug('ch2 coupling: %s', self.ch2_coupling_combo.currentText())
+        self.submit(scope.setCoupling, 'CH2', str(self.ch2_coupling_combo.currentText()))
 
     def persist_toggled(self):
-        if self.persist_checkbox.isChecked():
-            self._sendCommand('PERS ON')
-        else:
-            self._sendCommand('PERS OFF')
+        scope = self.scope()
+        if scope is not None:
+            self.submit(scope.setPersistence, self.persist_checkbox.isChecked())
 
     def equiv_toggled(self):
-        if self.equiv_checkbox.isChecked():
-            self._sendCommand('EQU ON')
-        else:
-            self._sendCommand('EQU OFF')
+        scope = self.scope()
+        if scope is not None:
+            self.submit(scope.setEquivalentTime, self.equiv_checkbox.isChecked())
 
 if __name__ == '__main__':
+    # --verbose logs every command sent to the scope
+    logging.basicConfig(level=logging.DEBUG if '--verbose' in sys.argv else logging.INFO,
+                        format='%(name)s: %(message)s')
     app = QtGui.QApplication(sys.argv)
     main = Main()
     main.show()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import os
+import json
+import threading
+import collections
+import numpy as np
+from hostmeasure import states, HYSTERESIS
+
+def _samples(wave):
+    """Return (samples, scale): the raw integers of a Waveform and their
+    volts per unit, or the volts of an array and None."""
+    if hasattr(wave, 'raw'):
+        return wave.raw, wave.scale
+    return np.asarray(wave), None
+
+def _runs(state, value):
+    """Return the (starts, stops) of the runs of value (+1 or -1) in state
+    (see hostmeasure.states) that come from the other side of the band and
+    end inside the frame (the others may be incomplete)."""
+    flags = state == value
+    edges = np.flatnonzero(flags[1:] != flags[:-1]) + 1
+    if flags[0]:
+        edges = edges[1:] # the first run started before the frame
+    if len(edges) % 2:
+        edges = edges[:-1] # the last run goes past the frame
+    starts, stops = edges[0::2], edges[1::2]
+    keep = state[starts - 1] == -value
+    return starts[keep], stops[keep]
+
+class Mask(object):
+    """Upper and lower limits (volts) of a channel at times (seconds from
+    the start of the frame).
+
+    The limits are resampled to the points of the frames and converted to
+    the raw units of their Waveforms once, so checking a frame is one
+    integer comparison per sample over preallocated buffers. Samples past
+    the times of the mask are not checked.
+    """
+    def __init__(self, times, upper, lower):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self._key = None
+
+    @classmethod
+    def fromGolden(cls, wave, tolerance, spread=0.0, interval=None):
+        """Mask tolerance volts around a golden capture, widened by spread
+        seconds on each side to allow for jitter."""
+        interval = interval or wave.interval
+        y = np.asarray(wave, dtype=np.float64)
+        upper = y.copy()
+        lower = y.copy()
+        for shift in range(1, int(round(spread / interval)) + 1):
+            np.maximum(upper[shift:], y[:-shift], out=upper[shift:])
+            np.maximum(upper[:-shift], y[shift:], out=upper[:-shift])
+            np.minimum(lower[shift:], y[:-shift], out=lower[shift:])
+            np.minimum(lower[:-shift], y[shift:], out=lower[:-shift])
+        return cls(np.arange(len(y)) * interval, upper + tolerance, lower - tolerance)
+
+    def _limits(self, points, interval, scale):
+        key = (points, interval, scale)
+        if key != self._key:
+            times = np.arange(points) * interval
+            upper = np.interp(times, self.times, self.upper, right=np.inf)
+            lower = np.interp(times, self.times, self.lower, right=-np.inf)
+            if scale is not None:
+                # raw > floor(upper / scale) <=> raw * scale > upper
+                upper = np.floor(upper / scale)
+                lower = np.ceil(lower / scale)
+            self._upper = upper
+            self._lower = lower
+            self._over = np.empty(points, dtype=bool)
+            self._under = np.empty(points, dtype=bool)
+            self._key = key
+        return self._upper, self._lower
+
+    def check(self, wave, interval):
+        """Return (violations, first violating sample or -1)."""
+        samples, scale = _samples(wave)
+        upper, lower = self._limits(len(samples), interval, scale)
+        over = np.greater(samples, upper, out=self._over)
+        np.logical_or(over, np.less(samples, lower, out=self._under), out=over)
+        violations = int(np.count_nonzero(over))
+        return violations, int(over.argmax()) if violations else -1
+
+class EventDetector(object):
+    """Finds glitches and runts in the frames of a channel.
+
+    A glitch is a pulse (either polarity, at the middle of low and high)
+    narrower than min_width seconds. A runt is a pulse that crosses low but
+    turns back before reaching high (or the other way round); runts shorter
+    than min_run samples are ignored. Like the edges of hostmeasure, a pulse
+    only starts and ends when the wave leaves a band of +-band volts around
+    the threshold (by default HYSTERESIS % of the amplitude), so noise
+    doesn't split pulses. Pulses cut by the ends of the frame are ignored.
+    """
+    def __init__(self, low, high, min_width=0.0, band=None, min_run=3):
+        self.low = float(low)
+        self.high = float(high)
+        self.min_width = float(min_width)
+        if band is None:
+            # low and high are 10% and 90% of the amplitude by default
+            band = (self.high - self.low) / 0.8 * HYSTERESIS / 100.0
+        self.band = float(band)
+        self.min_run = int(min_run)
+
+    @classmethod
+    def fromGolden(cls, wave, interval=None):
+        """Thresholds at 10% and 90% of a golden capture and min_width half
+        of its narrowest pulse."""
+        interval = interval or wave.interval
+        y = np.asarray(wave, dtype=np.float64)
+        base, top = y.min(), y.max()
+        detector = cls(base + 0.1 * (top - base), base + 0.9 * (top - base))
+        widths = [stops - starts for starts, stops in detector._pulses(y, None)]
+        widths = np.concatenate(widths)
+        widths = widths[widths >= detector.min_run]
+        if len(widths):
+            detector.min_width = widths.min() * interval / 2.0
+        return detector
+
+    def _state(self, samples, scale, level):
+        band = self.band
+        if scale is not None:
+            level, band = level / scale, band / scale
+        return states(samples, level, band)
+
+    def _pulses(self, samples, scale):
+        state = self._state(samples, scale, (self.low + self.high) / 2.0)
+        return _runs(state, 1), _runs(state, -1)
+
+    def detect(self, wave, interval):
+        """Return the sample indices of the (glitches, runts) of a frame."""
+        samples, scale = _samples(wave)
+
+        glitches = []
+        if self.min_width > 0:
+            for starts, stops in self._pulses(samples, scale):
+                glitches.append(starts[(stops - starts) * interval < self.min_width])
+        glitches = np.sort(np.concatenate(glitches)) if glitches else np.zeros(0, np.intp)
+
+        runts = []
+        for level, value, reduce, limit, reached in (
+                (self.low, 1, np.maximum, self.high, np.less),
+                (self.high, -1, np.minimum, self.low, np.greater)):
+            starts, stops = _runs(self._state(samples, scale, level), value)
+            longer = stops - starts >= self.min_run
+            starts, stops = starts[longer], stops[longer]
+            if not len(starts):
+                continue
+            if scale is not None:
+                limit /= scale
+            # peak of each pulse (the runs never reach the end of the frame)
+            bounds = np.empty(2 * len(starts), dtype=np.intp)
+            bounds[0::2] = starts
+            bounds[1::2] = stops
+            peaks = reduce.reduceat(samples, bounds)[0::2]
+            runts.append(starts[reached(peaks, limit)])
+        runts = np.sort(np.concatenate(runts)) if runts else np.zeros(0, np.intp)
+        return glitches, runts
+
+class MaskTester(object):
+    """Checks every frame against the masks and event detectors of its
+    channels, shared by the worker and the GUI.
+
+    Only the frames that fail (with context frames before and after them)
+    are saved to the output recording, and their results to failures.jsonl
+    next to it, so soak tests can run for days without storing every frame.
+    """
+    LOG = 'failures.jsonl'
+
+    def __init__(self, context=2):
+        self.context = context
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.masks = {} # channel -> Mask
+        self.detectors = {} # channel -> EventDetector
+        self.history = collections.deque(maxlen=context)
+        self.recording = None
+        self.log = None
+        self.after = 0 # context frames still to save
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.frames = 0
+            self.failed = 0
+            self.violations = 0
+            self.glitches = 0
+            self.runts = 0
+            self.last = {}
+
+    def setGolden(self, frame, tolerance, spread=0.0):
+        """Masks and event detectors for every channel of frame."""
+        intervals = frame.get('intervals', {})
+        with self.lock:
+            for name in frame['channels']:
+                interval = intervals.get(name, frame['interval'])
+                wave = frame['waves'][name]
+                self.masks[name] = Mask.fromGolden(wave, tolerance, spread, interval)
+                self.detectors[name] = EventDetector.fromGolden(wave, interval)
+            self.enabled = True
+
+    def remove(self):
+        with self.lock:
+            self.masks = {}
+            self.detectors = {}
+            self.enabled = False
+
+    def save(self, path):
+        arrays = {}
+        with self.lock:
+            for name, mask in self.masks.items():
+                arrays[name + ' times'] = mask.times
+                arrays[name + ' upper'] = mask.upper
+                arrays[name + ' lower'] = mask.lower
+            for name, detector in self.detectors.items():
+                arrays[name + ' events'] = np.array([detector.low, detector.high,
+                                                     detector.min_width, detector.band,
+                                                     detector.min_run])
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    def load(self, path):
+        masks = {}
+        detectors = {}
+        with np.load(path) as data:
+            for key in data.files:
+                name, kind = key.rsplit(' ', 1)
+                if kind == 'times':
+                    masks[name] = Mask(data[key], data[name + ' upper'], data[name + ' lower'])
+                elif kind == 'events':
+                    detectors[name] = EventDetector(*data[key])
+        with self.lock:
+            self.masks = masks
+            self.detectors = detectors
+            self.enabled = True
+
+    def setOutput(self, recording, path):
+        """Save the failing frames to recording (a Recording or
+        PoolRecording in the directory path), None to stop saving."""
+        with self.lock:
+            if self.log is not None:
+                self.log.close()
+                self.log = None
+            self.recording = recording
+            self.history.clear()
+            self.after = 0
+            if recording is not None:
+                self.log = open(os.path.join(path, self.LOG), 'a')
+
+    def _save(self, frame, results, failed):
+        self.recording.append(frame)
+        entry = {'frame': len(self.recording) - 1, 'time': frame['time'],
+                 'failed': failed, 'results': results}
+        self.log.write(json.dumps(entry) + '\n')
+        self.log.flush()
+
+    def add(self, frame):
+        """Check a frame; return its results (channel -> dict) or None."""
+        if not self.enabled:
+            return None
+        intervals = frame.get('intervals', {})
+        results = {}
+        with self.lock:
+            for name in frame['channels']:
+                mask = self.masks.get(name)
+                detector = self.detectors.get(name)
+                if mask is None and detector is None:
+                    continue
+                wave = frame['waves'][name]
+                interval = intervals.get(name, frame['interval'])
+                violations, first = mask.check(wave, interval) if mask is not None else (0, -1)
+                if detector is not None:
+                    glitches, runts = detector.detect(wave, interval)
+                else:
+                    glitches, runts = [], []
+                results[name] = {'violations': violations, 'first': first,
+                                 'glitches': [int(i) for i in glitches],
+                                 'runts': [int(i) for i in runts]}
+                self.violations += violations
+                self.glitches += len(glitches)
+                self.runts += len(runts)
+            failed = any(result['violations'] or result['glitches'] or result['runts']
+                         for result in results.values())
+            self.frames += 1
+            self.last = results
+            if failed:
+                self.failed += 1
+            if self.recording is not None:
+                # the worker takes the waves out of the frame after this
+                frame = dict(frame, waves=dict(frame['waves']))
+                if failed:
+                    while self.history:
+                        self._save(self.history.popleft(), None, False)
+                    self._save(frame, results, True)
+                    self.after = self.context
+                elif self.after:
+                    self._save(frame, results, False)
+                    self.after -= 1
+                else:
+                    self.history.append(frame)
+        return results
+
+    def summary(self):
+        with self.lock:
+            return {'frames': self.frames, 'failed': self.failed,
+                    'violations': self.violations, 'glitches': self.glitches,
+                    'runts': self.runts}
+
+    def envelopes(self):
+        """Return channel -> (times, upper, lower) of the masks (copies)."""
+        with self.lock:
+            return dict((name, (mask.times.copy(), mask.upper.copy(), mask.lower.copy()))
+                        for name, mask in self.masks.items())
+
+    def close(self):
+        self.setOutput(None, None)
@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import re
+import numpy as np
+from spectrum import window
+
+# Math channels are expressions of the channels, e.g.
+#   CH1 - CH2
+#   CH1 * CH2 / 50
+#   INTG(CH1)            running integral (V.s)
+#   DIFF(CH1)            derivative (V/s)
+#   LPF(CH1, 10e3)       low-pass filter, cut-off frequency in Hz
+#   HPF(CH1 - CH2, 50)   high-pass filter
+FUNCTIONS = ('INTG', 'DIFF', 'LPF', 'HPF')
+SOURCES = ('CH1', 'CH2')
+
+# order of the Butterworth magnitude response of the filters
+FILTER_ORDER = 4
+
+TOKEN = re.compile(r'\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|([A-Za-z]\w*)|(.))')
+
+def tokenize(expression):
+    tokens = []
+    for number, name, op in TOKEN.findall(expression):
+        if number:
+            tokens.append(('number', float(number)))
+        elif name:
+            tokens.append(('name', name.upper()))
+        elif op.strip():
+            tokens.append(('op', op))
+    return tokens
+
+class Node(object):
+    """Step of a compiled expression. prepare() allocates the output buffer
+    for a number of points once; evaluate() fills it and returns it."""
+    def __init__(self, *args):
+        self.args = args
+        self.out = None
+
+    def prepare(self, points, interval):
+        for arg in self.args:
+            arg.prepare(points, interval)
+        if self.out is None or len(self.out) != points:
+            self.out = np.empty(points)
+
+class Constant(Node):
+    def __init__(self, value):
+        super(Constant, self).__init__()
+        self.value = value
+
+    def prepare(self, points, interval):
+        pass
+
+    def evaluate(self, sources):
+        return self.value
+
+class Source(Node):
+    def __init__(self, name):
+        super(Source, self).__init__()
+        self.name = name
+
+    def evaluate(self, sources):
+        wave = sources[self.name]
+        if hasattr(wave, 'raw'):
+            # volts of a Waveform without its own float copy
+            return np.multiply(wave.raw, wave.scale, out=self.out)
+        return np.asarray(wave, dtype=np.float64)
+
+class Operator(Node):
+    UFUNCS = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide}
+
+    def __init__(self, op, a, b):
+        super(Operator, self).__init__(a, b)
+        self.ufunc = self.UFUNCS[op]
+
+    def evaluate(self, sources):
+        a, b = self.args
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.ufunc(a.evaluate(sources), b.evaluate(sources), out=self.out)
+
+class Negate(Node):
+    def evaluate(self, sources):
+        return np.negative(self.args[0].evaluate(sources), out=self.out)
+
+class Integrate(Node):
+    """Running integral (trapezoidal rule), 0 at the start of the frame."""
+    def prepare(self, points, interval):
+        super(Integrate, self).prepare(points, interval)
+        self.interval = interval
+
+    def evaluate(self, sources):
+        y = self.args[0].evaluate(sources)
+        out = self.out
+        out[0] = 0.0
+        np.add(y[1:], y[:-1], out=out[1:])
+        np.cumsum(out, out=out)
+        out *= self.interval / 2.0
+        return out
+
+class Differentiate(Node):
+    """Central differences, one-sided at the ends."""
+    def prepare(self, points, interval):
+        super(Differentiate, self).prepare(points, interval)
+        self.interval = interval
+
+    def evaluate(self, sources):
+        y = self.args[0].evaluate(sources)
+        out = self.out
+        np.subtract(y[2:], y[:-2], out=out[1:-1])
+        out[1:-1] /= 2.0
+        out[0] = y[1] - y[0]
+        out[-1] = y[-1] - y[-2]
+        out /= self.interval
+        return out
+
+class Filter(Node):
+    """Zero-phase low or high-pass filter applied in the frequency domain
+    with a Butterworth magnitude response. The frame is mirrored before
+    the FFT so that its ends don't wrap around into each other."""
+    def __init__(self, arg, cutoff, highpass):
+        super(Filter, self).__init__(arg)
+        self.cutoff = cutoff
+        self.highpass = highpass
+        self.key = None
+
+    def prepare(self, points, interval):
+        super(Filter, self).prepare(points, interval)
+        if self.key != (points, interval):
+            freqs = np.fft.rfftfreq(2 * points, interval)
+            with np.errstate(divide='ignore'):
+                ratio = (freqs / self.cutoff) ** (2 * FILTER_ORDER)
+                if self.highpass:
+                    ratio = 1.0 / ratio
+            self.response = 1.0 / np.sqrt(1.0 + ratio)
+            self.mirrored = np.empty(2 * points)
+            self.key = (points, interval)
+
+    def evaluate(self, sources):
+        y = self.args[0].evaluate(sources)
+        points = len(y)
+        self.mirrored[:points] = y
+        self.mirrored[points:] = y[::-1]
+        spectrum = np.fft.rfft(self.mirrored)
+        spectrum *= self.response
+        self.out[:] = np.fft.irfft(spectrum, 2 * points)[:points]
+        return self.out
+
+class Parser(object):
+    """Recursive descent parser of the math expressions:
+
+    expression := term (('+' | '-') term)*
+    term := unary (('*' | '/') unary)*
+    unary := '-' unary | number | source | function '(' expression [',' number] ')'
+             | '(' expression ')'
+    """
+    def __init__(self, expression):
+        self.tokens = tokenize(expression)
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if (kind is not None and token[0] != kind) or (value is not None and token[1] != value):
+            raise ValueError('Expected %s at %s' % (value or kind, token[1] or 'the end'))
+        self.position += 1
+        return token[1]
+
+    def parse(self):
+        node = self.expression()
+        if self.peek()[0] is not None:
+            raise ValueError('Unexpected %s' % self.peek()[1])
+        return node
+
+    def expression(self):
+        node = self.term()
+        while self.peek() in (('op', '+'), ('op', '-')):
+            node = Operator(self.take(), node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.peek() in (('op', '*'), ('op', '/')):
+            node = Operator(self.take(), node, self.unary())
+        return node
+
+    def unary(self):
+        kind, value = self.peek()
+        if (kind, value) == ('op', '-'):
+            self.take()
+            return Negate(self.unary())
+        if kind == 'number':
+            return Constant(self.take())
+        if (kind, value) == ('op', '('):
+            self.take()
+            node = self.expression()
+            self.take('op', ')')
+            return node
+        if kind == 'name' and value in SOURCES:
+            return Source(self.take())
+        if kind == 'name' and value in FUNCTIONS:
+            self.take()
+            self.take('op', '(')
+            arg = self.expression()
+            if not sources(arg):
+                # a constant has no time axis to integrate or filter over
+                raise ValueError('%s needs a channel' % value)
+            if value in ('LPF', 'HPF'):
+                self.take('op', ',')
+                cutoff = self.take('number')
+                if cutoff <= 0:
+                    raise ValueError('The cut-off frequency must be positive')
+                node = Filter(arg, cutoff, value == 'HPF')
+            elif value == 'INTG':
+                node = Integrate(arg)
+            else:
+                node = Differentiate(arg)
+            self.take('op', ')')
+            return node
+        raise ValueError('Unexpected %s' % (value or 'end of expression'))
+
+def sources(node):
+    """Names of the channels used by a compiled expression."""
+    if isinstance(node, Source):
+        return set([node.name])
+    return set().union(*[sources(arg) for arg in node.args])
+
+class MathChannel(object):
+    """An expression compiled once into a pipeline of NumPy operations over
+    preallocated buffers (reallocated only when the points change).
+
+    compute() returns a buffer that is overwritten by the next call.
+    """
+    def __init__(self, expression):
+        self.expression = expression
+        self.root = Parser(expression).parse()
+        self.sources = sources(self.root)
+        if not self.sources:
+            raise ValueError('%s uses no channel' % expression)
+
+    def compute(self, waves, interval):
+        points = min(len(waves[name]) for name in self.sources)
+        self.root.prepare(points, interval)
+        return self.root.evaluate(waves)
+
+def _vertex(left, center, right):
+    """Offset (-0.5..0.5) of the vertex of the parabola through three
+    points around a peak."""
+    curvature = left - 2 * center + right
+    if curvature >= 0:
+        return 0.0
+    return float(np.clip(0.5 * (left - right) / curvature, -0.5, 0.5))
+
+class Correlator(object):
+    """Delay and phase of CH2 relative to CH1 from their FFT
+    cross-correlation.
+
+    Both channels are Hann windowed and their cross-correlation divided by
+    the autocorrelation of the window, which removes the bias of the finite
+    frame towards lag zero. The peak nearest to lag zero is searched up to
+    half the frame and interpolated with a parabola for sub-sample resolution. The phase is
+    the delay at the strongest frequency of CH1, also interpolated between
+    the FFT bins (positive when CH2 lags).
+    """
+    def __init__(self):
+        self.points = None
+
+    def prepare(self, points):
+        if points != self.points:
+            self.padded = np.zeros((2, 2 * points)) # zero padded: linear correlation
+            lags = np.arange(2 * points)
+            lags[points:] -= 2 * points
+            self.search = np.abs(lags) < points // 2
+            self.lags = lags
+            self.window = window('Hann', points)
+            padded = np.zeros(2 * points)
+            padded[:points] = self.window
+            overlap = np.fft.irfft(np.abs(np.fft.rfft(padded)) ** 2, 2 * points)
+            self.overlap = overlap.clip(overlap[0] * 1e-6)
+            self.points = points
+
+    def correlate(self, wave1, wave2, interval):
+        """Return (delay (s), phase (degrees), frequency (Hz), peak
+        correlation coefficient) or None if a channel is flat."""
+        points = min(len(wave1), len(wave2))
+        self.prepare(points)
+        padded = self.padded
+        padded[0, :points] = np.asarray(wave1)[:points]
+        padded[1, :points] = np.asarray(wave2)[:points]
+        padded[:, :points] -= padded[:, :points].mean(axis=1)[:, np.newaxis]
+        padded[:, :points] *= self.window
+        energy = np.sqrt(np.square(padded[:, :points]).sum(axis=1))
+        if not energy.all():
+            return None
+        spectra = np.fft.rfft(padded, axis=1)
+        cross = spectra[1] * spectra[0].conj()
+        # lags 0..points-1 then -points..-1
+        correlation = np.fft.irfft(cross, 2 * points)
+        # the biased correlation picks the period nearest to lag zero, the
+        # unbiased one the exact position of its peak
+        peak = int(np.where(self.search, correlation, -np.inf).argmax())
+        correlation /= self.overlap
+        size = len(correlation)
+        while True:
+            step = max((peak - 1) % size, (peak + 1) % size, key=correlation.__getitem__)
+            if correlation[step] <= correlation[peak] or not self.search[step]:
+                break
+            peak = step
+        lag = float(self.lags[peak])
+        left, center, right = correlation[[peak - 1, peak, (peak + 1) % len(correlation)]]
+        lag += _vertex(left, center, right)
+        coefficient = correlation[peak] * self.overlap[0] / (energy[0] * energy[1])
+
+        with np.errstate(divide='ignore'):
+            magnitude = np.log(np.abs(spectra[0]))
+        magnitude[0] = -np.inf
+        k = min(max(int(magnitude.argmax()), 1), len(magnitude) - 2)
+        frequency = (k + _vertex(*magnitude[k - 1:k + 2])) / (2.0 * points * interval)
+        phase = (360.0 * frequency * lag * interval + 180.0) % 360.0 - 180.0
+        return lag * interval, phase, frequency, float(coefficient)
+
+class MathEngine(object):
+    """The math channels M1, M2... of the frames and the cross-correlation
+    of CH1 and CH2.
+
+    Expressions are separated by ';'. The channels of a scope pool
+    ('scope:CH1') are taken from its first scope.
+    """
+    def __init__(self):
+        self.channels = []
+        self.correlator = Correlator()
+        self.times = np.zeros(0)
+        self.interval = None
+
+    def configure(self, text):
+        """Compile the expressions of text; raises ValueError."""
+        channels = []
+        for expression in text.split(';'):
+            if expression.strip():
+                channels.append(MathChannel(expression.strip()))
+        self.channels = channels
+
+    def _sources(self, frame):
+        waves = {}
+        intervals = frame.get('intervals', {})
+        interval = None
+        for name in frame['channels']:
+            channel = name.rpartition(':')[2]
+            if channel not in waves:
+                waves[channel] = frame['waves'][name]
+                interval = interval or intervals.get(name, frame['interval'])
+        return waves, interval
+
+    def compute(self, frame):
+        """Return (times, name -> samples) of the math channels whose
+        sources are in frame (buffers overwritten by the next frame)."""
+        waves, interval = self._sources(frame)
+        results = {}
+        for i, channel in enumerate(self.channels):
+            if channel.sources <= set(waves):
+                results['M%d' % (i + 1)] = channel.compute(waves, interval)
+        points = max([len(samples) for samples in results.values()] or [0])
+        if len(self.times) != points or self.interval != interval:
+            self.times = np.arange(points) * interval
+            self.interval = interval
+        return self.times, results
+
+    def correlate(self, frame):
+        """Correlator.correlate of CH1 and CH2 or None."""
+        waves, interval = self._sources(frame)
+        if 'CH1' not in waves or 'CH2' not in waves:
+            return None
+        return self.correlator.correlate(waves['CH1'], waves['CH2'], interval)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import numpy as np
+from matplotlib.colors import colorConverter
+from profiling import profiler
+
+COLORS = {'CH1': 'b', 'CH2': 'g'}
+# other curves (e.g. the channels of a scope pool) take the next color
+CYCLE = ['b', 'g', 'r', 'c', 'm', 'y', 'k']
+
+def decimate(x, y, width):
+    """Min/max decimation of (x, y) to at most 2 * width vertices.
+
+    Each bin keeps its minimum and maximum so that glitches narrower than
+    a pixel are still drawn.
+    """
+    n = len(y)
+    if width <= 0 or n <= 2 * width:
+        return x, y
+    k = -(-n // width) # samples per bin
+    pad = (-n) % k
+    if pad:
+        y = np.concatenate((y, np.repeat(y[-1], pad)))
+    bins = y.reshape(-1, k)
+    ys = np.empty(2 * len(bins))
+    ys[0::2] = bins.min(axis=1)
+    ys[1::2] = bins.max(axis=1)
+    xs = np.repeat(x[::k], 2)
+    return xs, ys
+
+def colorize(layers, channels):
+    """Blend the (rows, columns, channels) intensity layers of a
+    persistence into one RGB image, each channel in its color."""
+    image = np.zeros(layers.shape[:2] + (3,))
+    for i, channel in enumerate(channels):
+        color = colorConverter.to_rgb(COLORS.get(channel, CYCLE[i % len(CYCLE)]))
+        image += layers[:, :, i, np.newaxis] * color
+    return np.clip(image, 0.0, 1.0)
+
+def _range(y):
+    # the fft view has -inf where the magnitude is zero
+    finite = y[np.isfinite(y)]
+    if not len(finite):
+        return 0.0, 0.0
+    return finite.min(), finite.max()
+
+class PlotManager(object):
+    """Draws the curves of the time and fft views on one axes.
+
+    One Line2D per (view, channel) is created once and then updated with
+    set_data. Redraws blit the lines over a cached background; the axes are
+    only rescaled (full draw) when the view, timebase or point count change
+    or the data leaves the y limits (unless the user zoomed in). The
+    persistence view shows an image instead of lines.
+    """
+    def __init__(self, canvas, ax):
+        self.canvas = canvas
+        self.ax = ax
+        self.lines = {} # (view, channel) -> Line2D
+        self.data = {} # (view, channel) -> full resolution (x, y)
+        self.view = None
+        self.scale = None
+        self.ylim = None
+        self.xscale = {'time': 'linear', 'fft': 'linear', 'persist': 'linear'}
+        self.image = None
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.ax.callbacks.connect('xlim_changed', self._on_xlim)
+
+    def _line(self, view, channel):
+        key = (view, channel)
+        if key not in self.lines:
+            others = len([key for key in self.lines if key[0] == view])
+            color = COLORS.get(channel, CYCLE[others % len(CYCLE)])
+            line, = self.ax.plot([], [], color=color, animated=True)
+            self.lines[key] = line
+        return self.lines[key]
+
+    def _visible(self):
+        artists = [line for line in self.lines.values() if line.get_visible()]
+        if self.image is not None and self.image.get_visible():
+            artists.insert(0, self.image)
+        return artists
+
+    def _on_draw(self, event):
+        # animated lines are not part of a normal draw: cache the background
+        # (axes, grid, ticks) and draw the lines on top of it
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self._visible():
+            self.ax.draw_artist(line)
+
+    def _on_xlim(self, ax):
+        # zooming/panning: decimate again the visible range
+        for key, (x, y) in self.data.items():
+            if key[0] == self.view:
+                self._set_data(self.lines[key], x, y)
+
+    def _set_data(self, line, x, y):
+        xmin, xmax = self.ax.get_xlim()
+        i, j = np.searchsorted(x, [xmin, xmax])
+        i = max(i - 1, 0)
+        j = min(j + 1, len(x))
+        width = int(self.ax.bbox.width)
+        line.set_data(*decimate(x[i:j], y[i:j], width))
+
+    def update(self, view, x, curves):
+        """Show curves (a dict channel -> y array sampled at x) in view.
+
+        A curve can also be an (x, y) tuple with its own sampling, e.g. the
+        channels of different scopes; x is then only the default.
+        """
+        series = {}
+        for channel, y in curves.items():
+            if isinstance(y, tuple):
+                series[channel] = (np.asarray(y[0]), np.asarray(y[1]))
+            else:
+                series[channel] = (np.asarray(x), np.asarray(y))
+        curves = dict((channel, y) for channel, (cx, y) in series.items())
+        first = min(cx[0] for cx, y in series.values())
+        last = max(cx[-1] for cx, y in series.values())
+        second = min(cx[1] for cx, y in series.values())
+        points = sum(len(cx) for cx, y in series.values())
+        scale = (view, points, first, last, self.xscale[view])
+        rescale = scale != self.scale or self.background is None
+        if not rescale and tuple(self.ax.get_ylim()) == self.ylim:
+            ymin, ymax = self.ylim
+            for y in curves.values():
+                low, high = _range(y)
+                if low < ymin or high > ymax:
+                    rescale = True
+                    break
+
+        self.view = view
+        self.data = {}
+        if rescale:
+            if self.ax.get_xscale() != self.xscale[view]:
+                self.ax.set_xscale(self.xscale[view])
+            xmin = first
+            if self.xscale[view] == 'log' and xmin <= 0:
+                # skip DC
+                xmin = second
+            self.ax.set_xlim([xmin, last])
+        for key, line in self.lines.items():
+            line.set_visible(key[0] == view and key[1] in curves)
+        if self.image is not None:
+            self.image.set_visible(False)
+        for channel, (cx, y) in series.items():
+            self.data[(view, channel)] = (cx, y)
+            self._set_data(self._line(view, channel), cx, y)
+
+        if rescale:
+            ranges = [_range(y) for y in curves.values()]
+            ymin = min(low for low, high in ranges)
+            ymax = max(high for low, high in ranges)
+            margin = (ymax - ymin) * 0.05 or 1.0
+            self.ax.set_ylim([ymin - margin, ymax + margin])
+            self.ylim = tuple(self.ax.get_ylim())
+            self.scale = scale
+            with profiler.timer('draw'):
+                self.canvas.draw()
+        else:
+            self.blit()
+
+    def replace(self, view, curves):
+        """Replace the data of curves (a dict channel -> (x, y)) shown in
+        view keeping the axes limits, e.g. with more samples of the zoomed
+        range."""
+        if view != self.view:
+            return
+        for channel, (x, y) in curves.items():
+            key = (view, channel)
+            if key in self.data:
+                self.data[key] = (np.asarray(x), np.asarray(y))
+                self._set_data(self.lines[key], *self.data[key])
+        self.blit()
+
+    def updateImage(self, view, image, extent):
+        """Show image (first row at the bottom) over extent, a [left, right,
+        bottom, top] list, in view."""
+        scale = (view, tuple(extent))
+        rescale = scale != self.scale or self.background is None
+        self.view = view
+        self.data = {}
+        for line in self.lines.values():
+            line.set_visible(False)
+        if self.image is None:
+            self.image = self.ax.imshow(image, origin='lower', aspect='auto',
+                                        interpolation='nearest', extent=extent,
+                                        animated=True)
+        else:
+            self.image.set_data(image)
+            self.image.set_extent(extent)
+        self.image.set_visible(True)
+        if rescale:
+            if self.ax.get_xscale() != self.xscale[view]:
+                self.ax.set_xscale(self.xscale[view])
+            self.ax.set_xlim(extent[:2])
+            self.ax.set_ylim(extent[2:])
+            self.ylim = tuple(self.ax.get_ylim())
+            self.scale = scale
+            with profiler.timer('draw'):
+                self.canvas.draw()
+        else:
+            self.blit()
+
+    def setLogX(self, view, log):
+        """Use a log x axis in view, redrawing the current curves."""
+        self.xscale[view] = 'log' if log else 'linear'
+        if view == self.view and self.data:
+            curves = {}
+            for (view, channel), (x, y) in self.data.items():
+                curves[channel] = (x, y)
+            self.update(view, None, curves)
+
+    def blit(self):
+        with profiler.timer('blit'):
+            self.canvas.restore_region(self.background)
+            for line in self._visible():
+                self.ax.draw_artist(line)
+            self.canvas.blit(self.ax.bbox)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import os
+import time
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+from instrument import Instrument
+from recorder import Recording
+
+def scopeName(port):
+    return os.path.basename(port)
+
+class ScopeThread(threading.Thread):
+    """Runs the acquisitions of one instrument on its own thread.
+
+    The serial I/O releases the GIL, so the scopes of a pool transfer their
+    waveforms at the same time.
+    """
+    def __init__(self, instrument):
+        super(ScopeThread, self).__init__()
+        self.daemon = True
+        self.instrument = instrument
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+
+    def run(self):
+        while True:
+            settings = self.jobs.get()
+            if settings is None:
+                break
+            try:
+                self.results.put((self.instrument.acquire(settings), None))
+            except Exception as e:
+                self.results.put((None, str(e)))
+
+class ScopePool(object):
+    """Several DS-8812 on different serial ports acquired concurrently.
+
+    acquire() returns one frame that combines the frames of every scope:
+    channels are named '<scope>:<channel>' (e.g. 'ttyUSB0:CH1') and the
+    interval of each channel is in 'intervals'. The per-scope metadata is
+    kept in 'frames'. It can be used wherever an Instrument is.
+    """
+    def __init__(self, ports, status=None):
+        self.ports = list(ports)
+        self.instruments = []
+        for port in self.ports:
+            report = None
+            if status is not None:
+                report = lambda message, port=port: status('%s: %s' % (scopeName(port), message))
+            self.instruments.append(Instrument(port, status=report))
+        self.threads = []
+
+    def open(self):
+        for instrument in self.instruments:
+            instrument.open()
+        if not self.threads:
+            self.threads = [ScopeThread(instrument) for instrument in self.instruments]
+            for thread in self.threads:
+                thread.start()
+
+    def close(self):
+        for thread in self.threads:
+            thread.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        for instrument in self.instruments:
+            instrument.close()
+
+    def acquire(self, settings):
+        start = time.time()
+        self.open()
+        for thread in self.threads:
+            thread.jobs.put(settings)
+        merged = {
+            'time': start,
+            'channels': [],
+            'points': None,
+            'interval': None,
+            'intervals': {},
+            'waves': {},
+            'measurements': {},
+            'frames': {},
+            'errors': {},
+            'throughput': 0.0,
+            'sent': 0,
+            'suppressed': 0,
+            'retried': 0,
+        }
+        for port, thread in zip(self.ports, self.threads):
+            frame, error = thread.results.get()
+            name = scopeName(port)
+            if frame is None:
+                merged['errors'][name] = error
+                continue
+            waves = frame.pop('waves')
+            merged['frames'][name] = frame
+            for channel in frame['channels']:
+                merged['channels'].append('%s:%s' % (name, channel))
+                merged['waves']['%s:%s' % (name, channel)] = waves[channel]
+                merged['intervals']['%s:%s' % (name, channel)] = frame['interval']
+            for (channel, mode), value in frame['measurements'].items():
+                merged['measurements'][('%s:%s' % (name, channel), mode)] = value
+            if merged['interval'] is None:
+                merged['points'] = frame['points']
+                merged['interval'] = frame['interval']
+            for key in ('throughput', 'sent', 'suppressed', 'retried'):
+                merged[key] += frame[key]
+        if merged['errors'] and not merged['frames']:
+            raise Exception('; '.join('%s: %s' % item for item in merged['errors'].items()))
+        # the frame ring and the recordings hold one length per frame, so a
+        # scope that fell back to ascii (fewer points) can't be merged
+        lengths = set(len(wave) for wave in merged['waves'].values())
+        if len(lengths) > 1:
+            raise Exception('Scopes returned different record lengths: %s' %
+                            ', '.join('%s %d' % (channel, len(merged['waves'][channel]))
+                                      for channel in merged['channels']))
+        return merged
+
+    def _broadcast(self, method, *args):
+        replies = [getattr(instrument, method)(*args) for instrument in self.instruments]
+        return replies[0]
+
+    def setChannel(self, channel, on):
+        return self._broadcast('setChannel', channel, on)
+
+    def setCoupling(self, channel, coupling):
+        return self._broadcast('setCoupling', channel, coupling)
+
+    def setBandwidthLimit(self, channel, on):
+        return self._broadcast('setBandwidthLimit', channel, on)
+
+    def setPersistence(self, on):
+        return self._broadcast('setPersistence', on)
+
+    def setEquivalentTime(self, on):
+        return self._broadcast('setEquivalentTime', on)
+
+    def aset(self):
+        return self._broadcast('aset')
+
+class PoolRecording(object):
+    """Records the frames of a pool in one Recording per scope (a
+    subdirectory of path named after the scope)."""
+    def __init__(self, path, ports, mode='a'):
+        self.recordings = dict((scopeName(port),
+                                Recording(os.path.join(path, scopeName(port)), mode))
+                               for port in ports)
+
+    def __len__(self):
+        return max(len(recording) for recording in self.recordings.values())
+
+    def append(self, merged):
+        for name, frame in merged['frames'].items():
+            waves = dict((channel, merged['waves']['%s:%s' % (name, channel)])
+                         for channel in frame['channels'])
+            self.recordings[name].append(dict(frame, waves=waves))
+
+    def close(self):
+        for recording in self.recordings.values():
+            recording.close()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+# Timings and sizes of the acquisition stages, e.g.:
+#   command DTWAVE?   round trip of each command (seconds)
+#   bytes DTWAVE?     bytes received for each command
+#   parse, measure wait, fft, draw, blit ...
+# Each metric keeps its last values in a fixed-size ring, so the memory
+# doesn't grow however long the application runs.
+
+import csv
+import json
+import time
+import threading
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+class Ring(object):
+    """The last capacity values of a metric."""
+    def __init__(self, capacity):
+        self.values = np.zeros(capacity)
+        self.total = 0
+
+    def add(self, value):
+        self.values[self.total % len(self.values)] = value
+        self.total += 1
+
+    def data(self):
+        return self.values[:min(self.total, len(self.values))]
+
+class Timer(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.time() - self.start)
+
+class Profiler(object):
+    """Collects the metrics of every thread (the worker, the command queue
+    and the GUI). Use add(name, value) or 'with profiler.timer(name):'.
+    """
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.enabled = True
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def add(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            ring = self.metrics.get(name)
+            if ring is None:
+                ring = self.metrics[name] = Ring(self.capacity)
+            ring.add(value)
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def clear(self):
+        with self.lock:
+            self.metrics = {}
+
+    def summary(self):
+        """Return a list of dicts with the name, total count, mean,
+        percentiles and max of each metric (over the values in its ring)."""
+        with self.lock:
+            items = [(name, ring.total, ring.data().copy())
+                     for name, ring in self.metrics.items()]
+        rows = []
+        for name, total, data in sorted(items):
+            row = {'name': name, 'count': total, 'mean': float(data.mean()),
+                   'max': float(data.max())}
+            for p, value in zip(PERCENTILES, np.percentile(data, PERCENTILES)):
+                row['p%d' % p] = float(value)
+            rows.append(row)
+        return rows
+
+    def format(self, names):
+        """Short text with the median/p99 of the timings in names, in ms."""
+        rows = dict((row['name'], row) for row in self.summary())
+        parts = []
+        for name in names:
+            if name in rows:
+                parts.append('%s %.0f/%.0f ms' % (name, rows[name]['p50'] * 1000.0,
+                                                  rows[name]['p99'] * 1000.0))
+        return ', '.join(parts)
+
+    def exportJson(self, path):
+        with open(path, 'w') as f:
+            json.dump({'time': time.time(), 'capacity': self.capacity,
+                       'metrics': self.summary()}, f, indent=2)
+
+    def exportCsv(self, path):
+        columns = ['name', 'count', 'mean'] + ['p%d' % p for p in PERCENTILES] + ['max']
+        with open(path, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in self.summary():
+                writer.writerow([row[column] for column in columns])
+
+# shared by all the modules
+profiler = Profiler()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import os
+import bisect
+import json
+import numpy as np
+from waveform import Waveform, SCALE
+
+class Recording(object):
+    """Frames stored on disk for long capture sessions.
+
+    The raw samples of the Waveforms of every frame are appended as the
+    scope sent them (channels interleaved, one block of channels x points
+    int32 per frame) to a growable memory mapped data file. A JSON lines
+    index next to it keeps the metadata of each frame (time, tdiv,
+    interval, points, the scale of each channel, coupling, bwl,
+    measurements) and its offset, so frames can be read back by number or
+    by time without loading the data file. Arrays of volts are stored in
+    the units of the scope (waveform.SCALE).
+
+    mode is 'a' to create or append to a recording or 'r' to read one.
+    """
+    DATA = 'frames.dat'
+    INDEX = 'index.jsonl'
+    DTYPE = np.int32
+    INITIAL_CAPACITY = 1 << 20 # samples
+
+    def __init__(self, path, mode='a'):
+        self.path = path
+        self.mode = mode
+        self.index = []
+        self.times = []
+        if mode == 'a' and not os.path.isdir(path):
+            os.makedirs(path)
+        index_path = os.path.join(path, self.INDEX)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for line in f:
+                    self._add_entry(json.loads(line))
+        self.end = 0
+        if self.index:
+            last = self.index[-1]
+            self.end = last['offset'] + len(last['channels']) * last['points']
+
+        data_path = os.path.join(path, self.DATA)
+        itemsize = np.dtype(self.DTYPE).itemsize
+        if mode == 'r':
+            self.index_file = None
+            if self.end:
+                self.data = np.memmap(data_path, dtype=self.DTYPE, mode='r')
+            else:
+                self.data = np.zeros(0, dtype=self.DTYPE)
+        else:
+            self.index_file = open(index_path, 'a')
+            if not os.path.exists(data_path):
+                self._resize(data_path, self.INITIAL_CAPACITY * itemsize)
+            self.data = np.memmap(data_path, dtype=self.DTYPE, mode='r+')
+
+    def _add_entry(self, entry):
+        self.index.append(entry)
+        self.times.append(entry['time'])
+
+    def _resize(self, data_path, size):
+        with open(data_path, 'ab') as f:
+            f.truncate(size)
+
+    def _reserve(self, samples):
+        if self.end + samples <= len(self.data):
+            return
+        # grow the file by doubling it and map it again
+        capacity = max(len(self.data), 1)
+        while capacity < self.end + samples:
+            capacity *= 2
+        self.data.flush()
+        data_path = os.path.join(self.path, self.DATA)
+        del self.data
+        self._resize(data_path, capacity * np.dtype(self.DTYPE).itemsize)
+        self.data = np.memmap(data_path, dtype=self.DTYPE, mode='r+')
+
+    def __len__(self):
+        return len(self.index)
+
+    def append(self, frame):
+        """Append a frame dict as returned by Main.acquireFrame."""
+        channels = frame['channels']
+        points = frame['points']
+        samples = len(channels) * points
+        self._reserve(samples)
+        block = self.data[self.end:self.end + samples].reshape(len(channels), points)
+        scales = []
+        for i, channel in enumerate(channels):
+            wave = frame['waves'][channel]
+            if isinstance(wave, Waveform):
+                block[i] = wave.raw
+                scales.append(wave.scale)
+            else:
+                block[i] = np.round(np.asarray(wave) / SCALE)
+                scales.append(SCALE)
+        self.data.flush()
+        entry = {
+            'time': frame['time'],
+            'tdiv': frame.get('tdiv'),
+            'interval': frame['interval'],
+            'points': points,
+            'channels': channels,
+            'scales': scales,
+            'coupling': frame.get('coupling'),
+            'bwl': frame.get('bwl'),
+            'measurements': dict(('%s %s' % key, value)
+                                 for key, value in frame['measurements'].items()),
+            'offset': self.end,
+        }
+        # the index line goes last so a crash never indexes missing data
+        self.index_file.write(json.dumps(entry) + '\n')
+        self.index_file.flush()
+        self._add_entry(entry)
+        self.end += samples
+
+    def frame(self, i):
+        """Return (waves, entry) of frame i. The waves are Waveforms over
+        read-only views of the data file."""
+        entry = self.index[i]
+        channels = entry['channels']
+        points = entry['points']
+        block = self.data[entry['offset']:entry['offset'] + len(channels) * points]
+        block = block.reshape(len(channels), points)
+        waves = dict((channel, Waveform(raw, entry['interval'], channel, scale, entry['time']))
+                     for channel, raw, scale in zip(channels, block, entry['scales']))
+        return waves, entry
+
+    def find(self, start, stop):
+        """Return the frame numbers acquired between times start and stop."""
+        return range(bisect.bisect_left(self.times, start),
+                     bisect.bisect_right(self.times, stop))
+
+    def close(self):
+        if self.index_file is not None:
+            self.data.flush()
+            self.index_file.close()
+            self.index_file = None
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import time
+import logging
+from profiling import profiler
+
+log = logging.getLogger(__name__)
+
+# (label, mode) of the per-channel measurements shown in the textedits
+MEASUREMENTS = [
+    ('Period', 'PERIOD'),
+    ('Duty', 'DUTY'),
+    ('Vmean', 'VMEAN'),
+    ('Freq', 'FREQ'),
+    ('Vrms', 'VRMS'),
+    ('Vpp', 'P-P'),
+    ('Rise', 'TR'),
+    ('Fall', 'TF'),
+    ('+PW', '+PW'),
+    ('-PW', '-PW'),
+    ('+PEAK', '+PEAK'),
+    ('-PEAK', '-PEAK'),
+]
+
+class MeasurementScheduler(object):
+    """Runs a batch of direct measurements on the scope.
+
+    Instead of sleeping a fixed second after each MSEL, MSRA? is polled
+    every poll_interval (the first time one poll_interval after MSEL) until
+    the scope returns a value or timeout expires.
+    The time waited for each measurement goes to the profiler.
+    """
+    def __init__(self, send, poll_interval=0.05, timeout=2.0):
+        self.send = send
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def ready(self, reply):
+        # the scope answers dashes while the measurement is pending and
+        # asterisks when it can't measure (final, returned as is)
+        return reply is not None and reply.strip('- ') != ''
+
+    def wait(self):
+        deadline = time.time() + self.timeout
+        polls = 0
+        while True:
+            # right after MSEL the scope may still answer the value of the
+            # previous measurement: never take the first instant reply
+            time.sleep(self.poll_interval)
+            reply = self.send('MSRA?')
+            polls += 1
+            if self.ready(reply) or time.time() >= deadline:
+                return reply, polls
+
+    def run(self, requests):
+        """Measure each (channel, mode) in requests.
+
+        Returns a dict mapping (channel, mode) to the reply of the scope.
+        """
+        results = {}
+        if not requests:
+            return results
+        self.send('DIRM A')
+        for channel, mode in requests:
+            start = time.time()
+            self.send('MSEL %s, %s' % (channel, mode))
+            reply, polls = self.wait()
+            results[(channel, mode)] = reply
+            elapsed = time.time() - start
+            profiler.add('measure wait', elapsed)
+            log.debug('measure %s %s: %.3f s (%d polls)', channel, mode, elapsed, polls)
+        return results
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+from collections import OrderedDict
+import numpy as np
+
+class SegmentCache(object):
+    """Full resolution samples of the record of one acquisition, fetched
+    on demand in chunks aligned to chunk samples.
+
+    fetch(channel, start, stop) must return the samples [start, stop) of
+    the record as an array or a Waveform (e.g. Instrument.fetchWave).
+    They are cached as volts. Consecutive missing chunks are
+    fetched with one transfer; at most capacity chunks are kept, the least
+    recently used are dropped first (but never the ones of the last get).
+    """
+    def __init__(self, fetch, record, chunk=1024, capacity=64):
+        self.fetch = fetch
+        self.record = record
+        self.chunk = chunk
+        self.capacity = capacity
+        self.chunks = OrderedDict() # (channel, index) -> samples
+        self.fetched = 0 # samples transferred
+
+    def clear(self):
+        self.chunks.clear()
+
+    def _load(self, channel, first, last):
+        # fetch the chunks first..last (inclusive) in one transfer
+        start = first * self.chunk
+        stop = min((last + 1) * self.chunk, self.record)
+        samples = np.asarray(self.fetch(channel, start, stop))
+        self.fetched += len(samples)
+        for index in range(first, last + 1):
+            offset = index * self.chunk - start
+            self.chunks[(channel, index)] = samples[offset:offset + self.chunk]
+
+    def get(self, channel, start, stop):
+        """Return the samples [start, stop) of channel."""
+        start = max(start, 0)
+        stop = min(stop, self.record)
+        first = start // self.chunk
+        last = (stop - 1) // self.chunk
+        missing = None
+        for index in range(first, last + 2):
+            cached = index <= last and (channel, index) in self.chunks
+            if index <= last and not cached:
+                if missing is None:
+                    missing = index
+            elif missing is not None:
+                self._load(channel, missing, index - 1)
+                missing = None
+        parts = []
+        for index in range(first, last + 1):
+            key = (channel, index)
+            # mark as recently used
+            parts.append(self.chunks.pop(key))
+            self.chunks[key] = parts[-1]
+        while len(self.chunks) > max(self.capacity, len(parts)):
+            self.chunks.popitem(last=False)
+        samples = np.concatenate(parts)
+        offset = start - first * self.chunk
+        return samples[offset:offset + stop - start]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import time
+import serial
+
+ACK = b'\x06'
+LF = b'\n'
+
+class SerialBuffer(object):
+    """Buffered reader for the replies of the scope.
+
+    Reads whatever the port has waiting in one call instead of one byte at
+    a time. Bytes received after the end of a reply are kept for the next one.
+
+    The port should be opened with a short timeout: reads time out after
+    timeout seconds without receiving any byte, however long the reply.
+    """
+    def __init__(self, port, timeout=2.0):
+        self.port = port
+        self.timeout = timeout
+        self.buf = bytearray()
+        self.transfer_bytes = 0
+        self.transfer_start = time.time()
+
+    def _fill(self):
+        # block for the first byte, then take everything that is waiting
+        deadline = time.time() + self.timeout
+        chunk = self.port.read(self.port.in_waiting or 1)
+        while not chunk:
+            if time.time() >= deadline:
+                raise serial.SerialTimeoutException('Timeout waiting for a reply')
+            chunk = self.port.read(self.port.in_waiting or 1)
+        self.buf += chunk
+        self.transfer_bytes += len(chunk)
+
+    def start_transfer(self):
+        self.transfer_bytes = len(self.buf)
+        self.transfer_start = time.time()
+
+    def throughput(self):
+        """Bytes per second received since start_transfer()."""
+        elapsed = time.time() - self.transfer_start
+        if elapsed <= 0:
+            return 0.0
+        return self.transfer_bytes / elapsed
+
+    # \n  ASCII Linefeed (LF)
+    # \r    ASCII Carriage Return (CR)
+    def readline(self):
+        """Return 'ack' or the next line including its terminator."""
+        start = 0
+        while True:
+            ack = self.buf.find(ACK, start)
+            lf = self.buf.find(LF, start)
+            if ack >= 0 and (lf < 0 or ack < lf):
+                del self.buf[:ack + 1]
+                return 'ack'
+            if lf >= 0:
+                line = bytes(self.buf[:lf + 1])
+                del self.buf[:lf + 1]
+                return line
+            start = len(self.buf)
+            self._fill()
+
+    def read(self, size):
+        """Return exactly size bytes (used for binary blocks)."""
+        deadline = time.time() + self.timeout
+        while len(self.buf) < size:
+            chunk = self.port.read(size - len(self.buf))
+            if chunk:
+                self.buf += chunk
+                self.transfer_bytes += len(chunk)
+                deadline = time.time() + self.timeout
+            elif time.time() >= deadline:
+                raise serial.SerialTimeoutException('Timeout reading %d bytes' % size)
+        data = bytes(self.buf[:size])
+        del self.buf[:size]
+        return data
+
+    def reset(self):
+        del self.buf[:]
+
+    def resync(self, idle=0.2, limit=5.0):
+        """Drop the rest of a broken reply: discard the input until the scope
+        has been quiet for idle seconds (or for at most limit seconds)."""
+        self.reset()
+        self.port.reset_input_buffer()
+        start = last = time.time()
+        while time.time() - last < idle and time.time() - start < limit:
+            if self.port.read(self.port.in_waiting or 1):
+                last = time.time()
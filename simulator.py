@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+# DS-8812 emulator on a pseudo terminal, for benchmarks and testing without
+# the scope:
+# $ python simulator.py
+# /dev/pts/3
+# $ python capture.py --port /dev/pts/3
+#
+# It answers the commands used by instrument.py with the same ACK (0x06)
+# framing and waits the time the bytes would take on the wire.
+
+import os
+import re
+import sys
+import time
+import select
+import threading
+import tty
+import numpy as np
+import hostmeasure
+
+ACK = b'\x06'
+NAK = b'\x15\r\n'
+
+class Simulator(object):
+    """Emulates a DS-8812 on the slave side of a pty (see port).
+
+    CH1 is a 1 V square wave of frequency freq, CH2 a 0.5 V sine delayed by
+    skew seconds, both with some noise. Replies are delayed as if sent at
+    baudrate (10 bits per byte); baudrate=None disables the delays.
+    Measurements become ready measure_delay seconds after MSEL. A fraction
+    drop of the replies is lost, to test timeouts and retries.
+    """
+    def __init__(self, baudrate=115200, freq=1e3, skew=20e-6, measure_delay=0.1,
+                 drop=0.0):
+        self.baudrate = baudrate
+        self.drop = drop
+        self.dropped = 0
+        self.freq = freq
+        self.skew = skew
+        self.measure_delay = measure_delay
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.thread = None
+        self.running = False
+        self.commands = 0
+        self.reset()
+
+    def reset(self):
+        self.mlen = 'SHORT'
+        self.points = 5120
+        self.range = None # DTRANGE, the whole record if None
+        self.tdiv = 1e-3
+        self.binary = False
+        self.source = 'CH1'
+        self.trace = {'1': True, '2': False}
+        self.coupling = {'1': 'DC', '2': 'DC'}
+        self.bwl = {'1': False, '2': False}
+        self.settings = {}
+        self.selected = None
+        self.selected_time = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def run(self):
+        buf = b''
+        while self.running:
+            readable, _, _ = select.select([self.master], [], [], 0.1)
+            if not readable:
+                continue
+            buf += os.read(self.master, 4096)
+            while b'\n' in buf:
+                line, buf = buf.split(b'\n', 1)
+                line = line.strip(b'\r').decode('ascii', 'replace').strip()
+                if line:
+                    self.commands += 1
+                    reply = self.handle(line)
+                    if self.drop and np.random.random() < self.drop:
+                        self.dropped += 1
+                        continue
+                    self.send(reply)
+
+    def send(self, data):
+        start = time.time()
+        for i in range(0, len(data), 1024):
+            chunk = data[i:i + 1024]
+            os.write(self.master, chunk)
+            if self.baudrate:
+                # 8N1: 10 bits per byte
+                delay = start + (i + len(chunk)) * 10.0 / self.baudrate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def record(self):
+        return 102400 if self.mlen == 'LONG' else 5120
+
+    def wave(self, channel, full=False):
+        """The samples DTWAVE? transfers (DTPOINTS spread over DTRANGE) or
+        the full record."""
+        record = self.record()
+        interval = self.tdiv * 10 / record
+        t = np.arange(record) * interval
+        if channel == 'CH1':
+            wave = np.where((t * self.freq) % 1.0 < 0.5, 1.0, -1.0)
+            # finite rise/fall times
+            wave = np.convolve(wave, np.ones(9) / 9.0, 'same')
+        else:
+            wave = 0.5 * np.sin(2 * np.pi * self.freq * (t - self.skew))
+        wave += np.random.normal(0, 0.002, record)
+        if self.bwl[channel[-1]]:
+            wave = np.convolve(wave, np.ones(5) / 5.0, 'same')
+        if self.coupling[channel[-1]] == 'GND':
+            wave[:] = 0.0
+        if not full:
+            start, stop = self.range or (0, record)
+            stop = min(stop, record)
+            wave = wave[start + np.arange(self.points) * (stop - start) // self.points]
+        return np.round(wave * 10000).astype('>i2') # 0.1mv
+
+    def waveform(self):
+        samples = self.wave(self.source)
+        if self.binary:
+            data = samples.tostring()
+            length = str(len(data)).encode('ascii')
+            return (b'#' + str(len(length)).encode('ascii') + length + data)
+        return ','.join(str(v) for v in samples).encode('ascii')
+
+    def measurement(self):
+        if self.selected is None or time.time() - self.selected_time < self.measure_delay:
+            return '---'
+        channel, mode = self.selected
+        interval = self.tdiv * 10 / self.record()
+        thresholds = dict(hostmeasure.THRESHOLDS)
+        for name in ('LEVL', 'MCND', 'SKLV'):
+            if name in self.settings:
+                hostmeasure.setThreshold(thresholds, name, self.settings[name])
+        if mode == 'SKEW':
+            level1, edge1, level2, edge2 = thresholds['skew']
+            value = hostmeasure.skew(self.wave('CH1', True) / 10000.0,
+                                     self.wave('CH2', True) / 10000.0, interval,
+                                     level1, thresholds['base'], (edge1, edge2), level2)
+        else:
+            value = hostmeasure.measure(self.wave(channel, True) / 10000.0,
+                                        interval, [mode], thresholds['level'], thresholds['low'],
+                                        thresholds['high'], thresholds['base'])[mode]
+        if value is None:
+            return '***'
+        return '%.4e' % value
+
+    def query(self, cmd):
+        if cmd == 'DTWAVE?':
+            return self.waveform()
+        if cmd == 'TDIV?':
+            return '%.3e' % self.tdiv
+        if cmd == 'MSRA?':
+            return self.measurement()
+        if cmd == 'DATE?':
+            return time.strftime('%Y/%m/%d %H:%M:%S')
+        m = re.match(r'C([12]):(TRA|CPL|BWL)\?$', cmd)
+        if m:
+            channel, setting = m.groups()
+            if setting == 'TRA':
+                return 'ON' if self.trace[channel] else 'OFF'
+            if setting == 'CPL':
+                return self.coupling[channel]
+            return 'ON' if self.bwl[channel] else 'OFF'
+        if cmd[:-1] in self.settings:
+            return self.settings[cmd[:-1]]
+        return None
+
+    def configure(self, cmd):
+        name, _, value = cmd.partition(' ')
+        value = value.strip()
+        m = re.match(r'C([12]):(TRA|CPL|BWL)$', name)
+        if m:
+            channel, setting = m.groups()
+            if setting == 'TRA' and value in ('ON', 'OFF'):
+                self.trace[channel] = value == 'ON'
+            elif setting == 'CPL' and value in ('AC', 'DC', 'GND'):
+                self.coupling[channel] = value
+            elif setting == 'BWL' and value in ('ON', 'OFF'):
+                self.bwl[channel] = value == 'ON'
+            else:
+                return False
+        elif name == 'DTFORM' and value in ('BIN', 'ASC'):
+            self.binary = value == 'BIN'
+        elif name == 'MLEN' and value in ('LONG', 'SHORT'):
+            self.mlen = value
+            self.range = None
+        elif name == 'DTPOINTS':
+            limit = 102400 if self.mlen == 'LONG' else 5120
+            if not value.isdigit() or not 0 < int(value) <= limit:
+                return False
+            self.points = int(value)
+        elif name == 'DTRANGE':
+            m = re.match(r'(\d+),(\d+)$', value)
+            if not m or not 0 <= int(m.group(1)) < int(m.group(2)) <= self.record():
+                return False
+            self.range = (int(m.group(1)), int(m.group(2)))
+        elif name == 'TDIV':
+            self.tdiv = float(value)
+        elif name == 'WAVESRC' and value in ('CH1', 'CH2'):
+            self.source = value
+        elif name == 'MSEL':
+            channel, _, mode = value.partition(',')
+            self.selected = (channel.strip(), mode.strip())
+            self.selected_time = time.time()
+        elif name == 'ASET':
+            # a few periods on screen
+            self.tdiv = 0.5 / self.freq
+        elif name in ('LEVL', 'MCND', 'SKLV'):
+            try:
+                hostmeasure.setThreshold({}, name, value)
+            except ValueError:
+                return False
+            self.settings[name] = value
+        elif name in ('DIRM', 'PERS', 'EQU', 'PROBE', 'AVGCNT'):
+            self.settings[name] = value
+        else:
+            return False
+        return True
+
+    def handle(self, cmd):
+        if cmd.endswith('?'):
+            reply = self.query(cmd)
+            if reply is None:
+                return NAK
+            if not isinstance(reply, bytes):
+                reply = reply.encode('ascii')
+            return ACK + reply + b'\r\n'
+        if self.configure(cmd):
+            return ACK
+        return NAK
+
+if __name__ == '__main__':
+    simulator = Simulator().start()
+    print(simulator.port)
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.close()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+# cosine-sum windows: w[k] = sum (-1)^j a_j cos(2 pi j k / n)
+WINDOWS = {
+    'Rectangular': [1.0],
+    'Hann': [0.5, 0.5],
+    'Blackman-Harris': [0.35875, 0.48829, 0.14128, 0.01168],
+    'Flat-top': [0.21557895, 0.41663158, 0.277263158, 0.083578947, 0.006947368],
+}
+
+AVERAGING = ['None', 'Exponential', 'Peak hold']
+
+def window(name, n):
+    """Periodic (DFT-even) window of length n."""
+    k = 2 * np.pi * np.arange(n) / n
+    w = np.zeros(n)
+    for j, a in enumerate(WINDOWS[name]):
+        w += (-1) ** j * a * np.cos(j * k)
+    return w
+
+class SpectrumPlan(object):
+    """Window, frequencies and buffers for one (points, interval) setup.
+
+    The wave is split into segments overlapping by half (Welch); with one
+    segment it is the whole wave. Spectra are scaled by the coherent gain of
+    the window so that a sine of amplitude A reads A/2 like a plain
+    rfft(wave)/points.
+    """
+    def __init__(self, points, interval, window_name, segments):
+        self.points = points
+        self.segments = segments
+        self.length = 2 * points // (segments + 1)
+        self.step = self.length // 2 if segments > 1 else self.length
+        self.window = window(window_name, self.length)
+        self.freqs = np.fft.rfftfreq(self.length, interval)
+        self.scale = 1.0 / self.window.sum() ** 2
+        self.windowed = np.empty((segments, self.length))
+        self.magnitude = np.empty((segments, len(self.freqs)))
+        self.power = np.empty(len(self.freqs))
+
+    def compute(self, wave):
+        """Return the averaged power spectrum of wave (a view of a buffer
+        that is overwritten by the next call)."""
+        wave = np.ascontiguousarray(wave, dtype=np.float64)
+        stride = wave.strides[0]
+        view = as_strided(wave, shape=(self.segments, self.length),
+                          strides=(self.step * stride, stride))
+        np.multiply(view, self.window, out=self.windowed)
+        np.absolute(np.fft.rfft(self.windowed, axis=1), out=self.magnitude)
+        np.square(self.magnitude, out=self.magnitude)
+        np.mean(self.magnitude, axis=0, out=self.power)
+        self.power *= self.scale
+        return self.power
+
+class SpectrumEngine(object):
+    """Spectrum analyzer over successive frames.
+
+    Plans are cached per (points, interval) so the window and frequency
+    arrays are computed once. Across frames the spectra of each channel are
+    averaged exponentially (weight alpha for the new frame) or peak held.
+    """
+    def __init__(self, window_name='Hann', segments=1, averaging='None', alpha=0.25):
+        self.plans = {}
+        self.averages = {}
+        self.alpha = alpha
+        self.window_name = None
+        self.segments = None
+        self.averaging = None
+        self.configure(window_name, segments, averaging)
+
+    def configure(self, window_name, segments, averaging):
+        if (window_name, segments, averaging) == (self.window_name, self.segments, self.averaging):
+            return
+        self.window_name = window_name
+        self.segments = segments
+        self.averaging = averaging
+        self.plans.clear()
+        self.reset()
+
+    def reset(self):
+        self.averages.clear()
+
+    def plan(self, points, interval):
+        key = (points, interval)
+        if key not in self.plans:
+            # the averages of another setup are meaningless now
+            self.reset()
+            self.plans[key] = SpectrumPlan(points, interval, self.window_name, self.segments)
+        return self.plans[key]
+
+    def update(self, channel, wave, interval):
+        """Add a frame of channel and return (freqs, dB) of its spectrum."""
+        plan = self.plan(len(wave), interval)
+        power = plan.compute(wave)
+        average = self.averages.get(channel)
+        if average is None or len(average) != len(power):
+            average = self.averages[channel] = power.copy()
+        elif self.averaging == 'Exponential':
+            power *= self.alpha
+            average *= 1 - self.alpha
+            average += power
+        elif self.averaging == 'Peak hold':
+            np.maximum(average, power, out=average)
+        else:
+            average[:] = power
+        with np.errstate(divide='ignore'):
+            return plan.freqs, 10 * np.log10(average)
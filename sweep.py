@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+# Unattended characterization runs over combinations of scope settings:
+# $ python sweep.py sweep.json --output results.csv
+#
+# sweep.json (or .yaml if PyYAML is installed):
+#   {
+#     "port": "/dev/ttyUSB0",
+#     "channels": ["CH1", "CH2"],
+#     "measurements": ["FREQ", "P-P", "TR"],   (default: all)
+#     "host": false,                           (measure on the host)
+#     "frames": 3,                             (frames per step)
+#     "aset": false,                           (autoset before the sweep)
+#     "fixed": {"PROBE": "AUTO,10", "LEVL": 50},
+#     "sweep": {"TDIV": [1e-4, 1e-3], "C1:CPL": ["AC", "DC"], "MLEN": ["SHORT", "LONG"]}
+#   }
+#
+# Every combination of the "sweep" values is a step. The steps are ordered
+# so that the costly settings (MLEN, TDIV...) change as little as possible
+# and only one setting changes between consecutive steps. Each frame is a
+# row of the CSV (step, frame, time, the settings, one column per
+# measurement); the number of finished steps is checkpointed next to it
+# (<output>.state.json), so running the same command again resumes an
+# interrupted run.
+
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import logging
+import argparse
+from instrument import Instrument, defaultSettings
+from hostmeasure import setThreshold
+from scheduler import MEASUREMENTS
+
+log = logging.getLogger(__name__)
+
+# relative cost of changing a setting (default 1): the costliest settings
+# are swept in the outer loops
+COSTS = {
+    'MLEN': 10, # reallocates the acquisition memory
+    'TDIV': 5,
+    'DTFORM': 4,
+    'AVGCNT': 4, # restarts the averaging
+    'EQU': 3,
+    'PERS': 3,
+    'DTPOINTS': 2,
+    'PROBE': 2,
+}
+
+def loadDefinition(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError('PyYAML is needed to read %s' % path)
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def cost(name):
+    return COSTS.get(name, 1)
+
+def orderSteps(sweep):
+    """Return the steps (dicts setting -> value) of the combinations of the
+    values in sweep.
+
+    The costliest settings go in the outer loops and the inner loops run
+    alternately forwards and backwards (a reflected Gray code), so exactly
+    one setting changes between consecutive steps.
+    """
+    names = sorted(sweep, key=lambda name: (-cost(name), name))
+    steps = [{}]
+    for name in names:
+        values = list(sweep[name])
+        nested = []
+        for i, step in enumerate(steps):
+            # go back and forth over the values of the inner setting
+            for value in (values if i % 2 == 0 else values[::-1]):
+                nested.append(dict(step, **{name: value}))
+        steps = nested
+    return steps
+
+def changeCost(steps):
+    """Total cost of the setting changes to run steps in order."""
+    total = 0
+    for previous, step in zip(steps, steps[1:]):
+        total += sum(cost(name) for name in step if step[name] != previous[name])
+    return total
+
+def acquireSettings(definition):
+    channels = definition.get('channels', ['CH1'])
+    settings = defaultSettings(channels)
+    modes = definition.get('measurements', 'all')
+    if modes != 'all':
+        settings['measurements'] = [(channel, mode) for channel, mode in settings['measurements']
+                                    if mode in modes]
+    settings['host'] = definition.get('host', False)
+    settings['binary'] = definition.get('binary', True)
+    return settings
+
+def apply(instrument, settings, values):
+    """Set values (setting -> value) on the scope. The settings that
+    Instrument.acquire sends itself go into settings instead, the thresholds
+    (LEVL, MCND, SKLV) into both for the host measurements."""
+    for name, value in sorted(values.items(), key=lambda item: -cost(item[0])):
+        value = str(value)
+        if name == 'MLEN':
+            settings['longmem'] = value == 'LONG'
+        elif name == 'DTFORM':
+            settings['binary'] = value == 'BIN'
+        elif name == 'DTPOINTS':
+            settings['preview'] = int(value)
+        elif name in ('C1:BWL', 'C2:BWL'):
+            settings['bwl']['CH' + name[1]] = value == 'ON'
+        else:
+            setThreshold(settings['thresholds'], name, value)
+            if name in ('C1:CPL', 'C2:CPL'):
+                settings['coupling']['CH' + name[1]] = value
+            if instrument.sendCommand('%s %s' % (name, value)) is None:
+                log.warning('%s %s failed', name, value)
+
+class Sequencer(object):
+    """Runs the steps of a sweep definition and writes the results table.
+
+    The checkpoint keeps a fingerprint of the definition: a different
+    definition with the same output starts from the beginning.
+    """
+    def __init__(self, instrument, definition, output):
+        self.instrument = instrument
+        self.definition = definition
+        self.output = output
+        self.state_path = output + '.state.json'
+        self.steps = orderSteps(definition.get('sweep', {}))
+        self.names = sorted(definition.get('sweep', {}))
+        self.settings = acquireSettings(definition)
+        self.columns = (['step', 'frame', 'time'] + self.names +
+                        ['%s %s' % request for request in self.settings['measurements']])
+        self.fingerprint = hashlib.sha1(
+            json.dumps(definition, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def loadCheckpoint(self):
+        """Return the number of finished steps, dropping the rows of a step
+        that was interrupted."""
+        if not os.path.exists(self.state_path) or not os.path.exists(self.output):
+            return 0
+        with open(self.state_path) as f:
+            state = json.load(f)
+        if state.get('fingerprint') != self.fingerprint:
+            return 0
+        done = state['done']
+        with open(self.output) as f:
+            rows = list(csv.reader(f))
+        kept = [row for row in rows[1:] if int(row[0]) < done]
+        if len(kept) != len(rows) - 1:
+            with open(self.output, 'w') as f:
+                writer = csv.writer(f)
+                writer.writerow(rows[0])
+                writer.writerows(kept)
+        return done
+
+    def saveCheckpoint(self, done):
+        # write and rename so a crash never leaves a truncated checkpoint
+        path = self.state_path + '.tmp'
+        with open(path, 'w') as f:
+            json.dump({'fingerprint': self.fingerprint, 'done': done,
+                       'steps': len(self.steps), 'time': time.time()}, f)
+        os.rename(path, self.state_path)
+
+    def run(self):
+        done = self.loadCheckpoint()
+        if done:
+            log.info('resuming at step %d of %d', done, len(self.steps))
+        new = not done or not os.path.exists(self.output)
+        frames = self.definition.get('frames', 1)
+        with open(self.output, 'w' if new else 'a') as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(self.columns)
+            apply(self.instrument, self.settings, self.definition.get('fixed', {}))
+            if self.definition.get('aset'):
+                self.instrument.aset()
+            for i in range(done, len(self.steps)):
+                step = self.steps[i]
+                apply(self.instrument, self.settings, step)
+                for j in range(frames):
+                    frame = self.instrument.acquire(self.settings)
+                    row = [i, j, frame['time']] + [step[name] for name in self.names]
+                    row += [frame['measurements'].get(request)
+                            for request in self.settings['measurements']]
+                    writer.writerow(row)
+                f.flush()
+                os.fsync(f.fileno())
+                self.saveCheckpoint(i + 1)
+                log.info('step %d/%d: %s', i + 1, len(self.steps), step)
+        return len(self.steps) - done
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a sweep of DS-8812 settings')
+    parser.add_argument('definition', help='sweep definition (JSON or YAML)')
+    parser.add_argument('--output', default='sweep.csv', help='results table (CSV)')
+    parser.add_argument('--port', help='serial port (overrides the definition)')
+    parser.add_argument('--dry-run', action='store_true', help='only print the steps in order')
+    parser.add_argument('--verbose', action='store_true', help='log the commands sent')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(name)s: %(message)s')
+
+    try:
+        definition = loadDefinition(args.definition)
+    except (IOError, ValueError) as e:
+        sys.stderr.write('%s\n' % e)
+        return 1
+    for mode in definition.get('measurements', []) if definition.get('measurements') != 'all' else []:
+        if mode not in [m for label, m in MEASUREMENTS] + ['SKEW']:
+            sys.stderr.write('Unknown measurement %s\n' % mode)
+            return 1
+    if args.dry_run:
+        steps = orderSteps(definition.get('sweep', {}))
+        for i, step in enumerate(steps):
+            print('%d %s' % (i, json.dumps(step, sort_keys=True)))
+        print('change cost %d' % changeCost(steps))
+        return 0
+
+    instrument = Instrument(args.port or definition.get('port', '/dev/ttyUSB0'))
+    try:
+        instrument.open()
+        Sequencer(instrument, definition, args.output).run()
+    except Exception as e:
+        sys.stderr.write('%s\n' % e)
+        return 1
+    finally:
+        instrument.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
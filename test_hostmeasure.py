@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+# Tests of the host measurements on synthetic signals with known values:
+# $ python -m unittest test_hostmeasure
+
+import unittest
+import numpy as np
+import hostmeasure
+
+INTERVAL = 1e-6
+POINTS = 10000
+
+def trapezoid(period, high, rise, fall, delay=0.0, amplitude=2.0):
+    """Pulse train from 0 to amplitude: rise seconds ramping up from each
+    period start (+ delay), high seconds on top, fall seconds ramping down."""
+    t = (np.arange(POINTS) * INTERVAL - delay) % period
+    corners = [0.0, rise, rise + high, rise + high + fall, period]
+    return np.interp(t, corners, [0.0, amplitude, amplitude, 0.0, 0.0])
+
+class SquareTest(unittest.TestCase):
+    period = 1e-3
+    high = 280e-6
+    rise = 20e-6
+    fall = 40e-6
+
+    def setUp(self):
+        self.wave = trapezoid(self.period, self.high, self.rise, self.fall)
+        self.results = hostmeasure.measure(self.wave, INTERVAL)
+
+    def assertClose(self, value, expected, tolerance=0.01):
+        self.assertIsNotNone(value)
+        self.assertLess(abs(value - expected), tolerance * abs(expected))
+
+    def test_period(self):
+        self.assertClose(self.results['PERIOD'], self.period)
+        self.assertClose(self.results['FREQ'], 1.0 / self.period)
+
+    def test_pulse_widths(self):
+        # at 50% the pulse lasts half of each ramp plus the top
+        width = self.high + (self.rise + self.fall) / 2.0
+        self.assertClose(self.results['+PW'], width)
+        self.assertClose(self.results['-PW'], self.period - width)
+        self.assertClose(self.results['DUTY'], 100.0 * width / self.period)
+
+    def test_transitions(self):
+        # 10% to 90% of a linear ramp
+        self.assertClose(self.results['TR'], 0.8 * self.rise, 0.05)
+        self.assertClose(self.results['TF'], 0.8 * self.fall, 0.05)
+
+    def test_levels(self):
+        self.assertClose(self.results['P-P'], 2.0)
+        self.assertClose(self.results['+PEAK'], 2.0)
+        self.assertEqual(self.results['-PEAK'], 0.0)
+
+    def test_skew(self):
+        delayed = trapezoid(self.period, self.high, self.rise, self.fall, delay=37e-6)
+        self.assertClose(hostmeasure.skew(self.wave, delayed, INTERVAL), 37e-6)
+        self.assertClose(hostmeasure.skew(delayed, self.wave, INTERVAL), -37e-6)
+
+    def test_thresholds(self):
+        # at level 20% the pulse starts 20% up the rise and ends 20% up the fall
+        results = hostmeasure.measure(self.wave, INTERVAL, ['+PW', 'TR'], level=20, low=30, high=70)
+        self.assertClose(results['+PW'], self.high + 0.8 * (self.rise + self.fall))
+        self.assertClose(results['TR'], 0.4 * self.rise, 0.05)
+
+    def test_skew_edges(self):
+        delayed = trapezoid(self.period, self.high, self.rise, self.fall, delay=37e-6)
+        # falling edge of wave to the falling edge of delayed at 80%
+        value = hostmeasure.skew(self.wave, delayed, INTERVAL, edges=('FALL', 'FALL'), level2=80)
+        self.assertClose(value, 37e-6 - 0.3 * self.fall)
+
+class ThresholdsTest(unittest.TestCase):
+    def test_commands(self):
+        thresholds = dict(hostmeasure.THRESHOLDS)
+        self.assertTrue(hostmeasure.setThreshold(thresholds, 'LEVL', '30'))
+        self.assertTrue(hostmeasure.setThreshold(thresholds, 'MCND', 'P-P, 80, 20'))
+        self.assertTrue(hostmeasure.setThreshold(thresholds, 'SKLV', '40,RISE,60,FALL'))
+        self.assertEqual(thresholds, {'level': 30, 'low': 20, 'high': 80, 'base': 'P-P',
+                                      'skew': (40, 'RISE', 60, 'FALL')})
+        self.assertFalse(hostmeasure.setThreshold(thresholds, 'TDIV', '1e-3'))
+
+    def test_bad_values(self):
+        for name, value in (('LEVL', '95'), ('MCND', 'T-B,10,90'), ('MCND', 'T-B'),
+                            ('SKLV', '50,UP,50,RISE')):
+            self.assertRaises(ValueError, hostmeasure.setThreshold, {}, name, value)
+
+class SineTest(unittest.TestCase):
+    def setUp(self):
+        t = np.arange(POINTS) * INTERVAL
+        self.wave = 1.5 * np.sin(2 * np.pi * 2e3 * t)
+        self.results = hostmeasure.measure(self.wave, INTERVAL)
+
+    def test_values(self):
+        self.assertAlmostEqual(self.results['FREQ'], 2e3, delta=2.0)
+        self.assertAlmostEqual(self.results['PERIOD'], 0.5e-3, delta=0.5e-6)
+        self.assertAlmostEqual(self.results['DUTY'], 50.0, delta=0.5)
+        self.assertAlmostEqual(self.results['VRMS'], 1.5 / np.sqrt(2), delta=1e-3)
+        self.assertAlmostEqual(self.results['VMEAN'], 0.0, delta=1e-3)
+        self.assertAlmostEqual(self.results['P-P'], 3.0, delta=1e-3)
+
+class NoisySineTest(unittest.TestCase):
+    # long memory: 100 ns sampling of a 1 kHz sine, so the noise crosses
+    # the levels many times on each slow edge
+    interval = 1e-7
+    points = 102400
+
+    def setUp(self):
+        t = np.arange(self.points) * self.interval
+        noise = np.random.RandomState(0).normal(0, 0.002, self.points)
+        self.wave = 0.5 * np.sin(2 * np.pi * 1e3 * t) + noise
+        self.delayed = 0.5 * np.sin(2 * np.pi * 1e3 * (t - 20e-6)) + noise[::-1]
+
+    def test_values(self):
+        results = hostmeasure.measure(self.wave, self.interval)
+        self.assertAlmostEqual(results['FREQ'], 1e3, delta=5.0)
+        self.assertAlmostEqual(results['PERIOD'], 1e-3, delta=5e-6)
+        self.assertAlmostEqual(results['DUTY'], 50.0, delta=1.0)
+        self.assertAlmostEqual(results['+PW'], 0.5e-3, delta=10e-6)
+        self.assertAlmostEqual(results['-PW'], 0.5e-3, delta=10e-6)
+        # 10-90% of a sine: (asin(0.8) - asin(-0.8)) / (2 pi f)
+        self.assertAlmostEqual(results['TR'], 2 * np.arcsin(0.8) / (2 * np.pi * 1e3), delta=10e-6)
+
+    def test_skew(self):
+        self.assertAlmostEqual(hostmeasure.skew(self.wave, self.delayed, self.interval),
+                               20e-6, delta=1e-6)
+
+    def test_crossings(self):
+        rise, fall = hostmeasure.crossings(self.wave, 0.0, 0.05)
+        self.assertEqual((len(rise), len(fall)), (10, 10))
+        # without hysteresis the noise adds edges
+        rise, fall = hostmeasure.crossings(self.wave, 0.0)
+        self.assertGreater(len(rise), 10)
+
+class FlatTest(unittest.TestCase):
+    def test_flat(self):
+        results = hostmeasure.measure(np.ones(POINTS) * 0.5, INTERVAL)
+        for mode in ('PERIOD', 'FREQ', 'DUTY', 'TR', 'TF', '+PW', '-PW'):
+            self.assertIsNone(results[mode], mode)
+        self.assertAlmostEqual(results['VMEAN'], 0.5)
+        self.assertAlmostEqual(results['VRMS'], 0.5)
+        self.assertEqual(results['P-P'], 0.0)
+
+    def test_flat_skew(self):
+        flat = np.zeros(POINTS)
+        self.assertIsNone(hostmeasure.skew(flat, flat, INTERVAL))
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, hostmeasure.measure, np.zeros(POINTS), INTERVAL, ['BOGUS'])
+
+if __name__ == '__main__':
+    unittest.main()
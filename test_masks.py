@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+# Tests of the mask and event checks on synthetic frames:
+# $ python -m unittest test_masks
+
+import unittest
+import numpy as np
+from waveform import Waveform
+from masks import EventDetector, MaskTester
+
+INTERVAL = 1e-7
+POINTS = 102400
+
+def waveform(volts):
+    return Waveform(np.round(volts / 1e-4).astype(np.int16), INTERVAL, 'CH1')
+
+def frame(volts):
+    return {'time': 0.0, 'channels': ['CH1'], 'points': len(volts), 'interval': INTERVAL,
+            'waves': {'CH1': waveform(volts)}, 'measurements': {}}
+
+class EventTest(unittest.TestCase):
+    def setUp(self):
+        # 1 kHz sine heavily oversampled with noise around every threshold
+        t = np.arange(POINTS) * INTERVAL
+        self.random = np.random.RandomState(0)
+        self.sine = 0.5 * np.sin(2 * np.pi * 1e3 * t)
+        self.tester = MaskTester()
+        self.tester.setGolden(frame(self.noisy()), 0.05)
+
+    def noisy(self):
+        return self.sine + self.random.normal(0, 0.002, POINTS)
+
+    def test_golden(self):
+        detector = self.tester.detectors['CH1']
+        # half of the pulses of the sine, not of the noise
+        self.assertAlmostEqual(detector.min_width, 0.25e-3, delta=5e-6)
+
+    def test_noise_passes(self):
+        for i in range(5):
+            results = self.tester.add(frame(self.noisy()))['CH1']
+            self.assertEqual(results['glitches'], [])
+            self.assertEqual(results['runts'], [])
+            self.assertEqual(results['violations'], 0)
+        self.assertEqual(self.tester.summary()['failed'], 0)
+
+    def test_events(self):
+        volts = self.noisy()
+        volts[22500:22550] = -0.5 # glitch at the top of a positive half
+        # the top of a positive pulse cut at 0.3 V
+        volts[50000:60000] = np.minimum(volts[50000:60000], 0.3)
+        volts[55000:60000] = -0.5
+        glitches, runts = self.tester.detectors['CH1'].detect(waveform(volts), INTERVAL)
+        self.assertIn(22500, glitches)
+        self.assertEqual(len(runts), 1)
+        # the runt starts where the pulse crosses low, on the way up
+        self.assertTrue(47500 <= runts[0] < 50000)
+
+    def test_save(self):
+        detector = EventDetector(-0.4, 0.4, 1e-4, 0.05, 4)
+        self.assertEqual(detector.band, 0.05)
+        self.assertEqual(detector.min_run, 4)
+        self.assertAlmostEqual(EventDetector(0.1, 0.9).band, 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
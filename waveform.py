@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import time
+import numpy as np
+
+# the scope sends the samples in 0.1mv units
+SCALE = 1e-4
+
+def parseAscii(reply):
+    # comma separated integers
+    return np.array(reply.split(','), dtype=np.int32)
+
+def parseBinary(data):
+    # big-endian 16-bit words, converted once to the native order
+    return np.frombuffer(data, dtype='>i2').astype(np.int16)
+
+class Waveform(object):
+    """Samples of one channel as the scope sent them.
+
+    raw keeps the integer samples (2 bytes each for binary transfers) and
+    scale converts them to volts. The float64 volts are only computed when
+    asked for and then cached; np.asarray(waveform) returns them too, so
+    numpy code can take a Waveform where it took an array.
+    """
+    __slots__ = ('raw', 'scale', 'interval', 'channel', 'time', '_volts')
+
+    def __init__(self, raw, interval, channel, scale=SCALE, timestamp=None):
+        self.raw = raw
+        self.scale = scale
+        self.interval = interval
+        self.channel = channel
+        self.time = time.time() if timestamp is None else timestamp
+        self._volts = None
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.volts
+        return self.volts.astype(dtype)
+
+    @property
+    def volts(self):
+        if self._volts is None:
+            self._volts = self.raw * self.scale
+        return self._volts
+
+    def times(self):
+        return np.arange(len(self.raw)) * self.interval
+
+    def release(self):
+        """Drop the cached volts (e.g. before keeping the frame for long)."""
+        self._volts = None
+
+    @property
+    def nbytes(self):
+        cached = self._volts.nbytes if self._volts is not None else 0
+        return self.raw.nbytes + cached
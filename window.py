@@ -122,6 +122,10 @@ class Ui_MainWindow(object):
         self.serial_combo = QtGui.QComboBox(self.centralwidget)
         self.serial_combo.setObjectName(_fromUtf8("serial_combo"))
         self.cmd_query_hlayout.addWidget(self.serial_combo)
+        self.pool_button = QtGui.QToolButton(self.centralwidget)
+        self.pool_button.setPopupMode(QtGui.QToolButton.InstantPopup)
+        self.pool_button.setObjectName(_fromUtf8("pool_button"))
+        self.cmd_query_hlayout.addWidget(self.pool_button)
         self.autoset_button = QtGui.QPushButton(self.centralwidget)
         self.autoset_button.setObjectName(_fromUtf8("autoset_button"))
         self.cmd_query_hlayout.addWidget(self.autoset_button)
@@ -133,33 +137,134 @@ class Ui_MainWindow(object):
         self.acquire_button.setSizePolicy(sizePolicy)
         self.acquire_button.setObjectName(_fromUtf8("acquire_button"))
         self.cmd_query_hlayout.addWidget(self.acquire_button)
+        self.run_button = QtGui.QPushButton(self.centralwidget)
+        sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Fixed, QtGui.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.run_button.sizePolicy().hasHeightForWidth())
+        self.run_button.setSizePolicy(sizePolicy)
+        self.run_button.setCheckable(True)
+        self.run_button.setObjectName(_fromUtf8("run_button"))
+        self.cmd_query_hlayout.addWidget(self.run_button)
+        self.single_button = QtGui.QPushButton(self.centralwidget)
+        sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Fixed, QtGui.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.single_button.sizePolicy().hasHeightForWidth())
+        self.single_button.setSizePolicy(sizePolicy)
+        self.single_button.setObjectName(_fromUtf8("single_button"))
+        self.cmd_query_hlayout.addWidget(self.single_button)
         self.fft_button = QtGui.QPushButton(self.centralwidget)
         sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Fixed, QtGui.QSizePolicy.Fixed)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
         sizePolicy.setHeightForWidth(self.fft_button.sizePolicy().hasHeightForWidth())
         self.fft_button.setSizePolicy(sizePolicy)
+        self.fft_button.setCheckable(True)
         self.fft_button.setObjectName(_fromUtf8("fft_button"))
         self.cmd_query_hlayout.addWidget(self.fft_button)
+        self.measure_button = QtGui.QToolButton(self.centralwidget)
+        self.measure_button.setPopupMode(QtGui.QToolButton.InstantPopup)
+        self.measure_button.setObjectName(_fromUtf8("measure_button"))
+        self.cmd_query_hlayout.addWidget(self.measure_button)
+        self.measure_mode_combo = QtGui.QComboBox(self.centralwidget)
+        self.measure_mode_combo.setObjectName(_fromUtf8("measure_mode_combo"))
+        self.measure_mode_combo.addItem(_fromUtf8(""))
+        self.measure_mode_combo.addItem(_fromUtf8(""))
+        self.cmd_query_hlayout.addWidget(self.measure_mode_combo)
         self.longmem_checkbox = QtGui.QCheckBox(self.centralwidget)
         self.longmem_checkbox.setObjectName(_fromUtf8("longmem_checkbox"))
         self.cmd_query_hlayout.addWidget(self.longmem_checkbox)
+        self.binary_checkbox = QtGui.QCheckBox(self.centralwidget)
+        self.binary_checkbox.setChecked(True)
+        self.binary_checkbox.setObjectName(_fromUtf8("binary_checkbox"))
+        self.cmd_query_hlayout.addWidget(self.binary_checkbox)
+        self.preview_checkbox = QtGui.QCheckBox(self.centralwidget)
+        self.preview_checkbox.setObjectName(_fromUtf8("preview_checkbox"))
+        self.cmd_query_hlayout.addWidget(self.preview_checkbox)
         self.persist_checkbox = QtGui.QCheckBox(self.centralwidget)
         self.persist_checkbox.setObjectName(_fromUtf8("persist_checkbox"))
         self.cmd_query_hlayout.addWidget(self.persist_checkbox)
         self.equiv_checkbox = QtGui.QCheckBox(self.centralwidget)
         self.equiv_checkbox.setObjectName(_fromUtf8("equiv_checkbox"))
         self.cmd_query_hlayout.addWidget(self.equiv_checkbox)
+        self.record_checkbox = QtGui.QCheckBox(self.centralwidget)
+        self.record_checkbox.setObjectName(_fromUtf8("record_checkbox"))
+        self.cmd_query_hlayout.addWidget(self.record_checkbox)
         spacerItem2 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
         self.cmd_query_hlayout.addItem(spacerItem2)
         self.verticalLayout.addLayout(self.cmd_query_hlayout)
+        self.fft_hlayout = QtGui.QHBoxLayout()
+        self.fft_hlayout.setObjectName(_fromUtf8("fft_hlayout"))
+        self.fft_window_label = QtGui.QLabel(self.centralwidget)
+        self.fft_window_label.setObjectName(_fromUtf8("fft_window_label"))
+        self.fft_hlayout.addWidget(self.fft_window_label)
+        self.fft_window_combo = QtGui.QComboBox(self.centralwidget)
+        self.fft_window_combo.setObjectName(_fromUtf8("fft_window_combo"))
+        self.fft_window_combo.addItem(_fromUtf8(""))
+        self.fft_window_combo.addItem(_fromUtf8(""))
+        self.fft_window_combo.addItem(_fromUtf8(""))
+        self.fft_window_combo.addItem(_fromUtf8(""))
+        self.fft_hlayout.addWidget(self.fft_window_combo)
+        self.fft_segments_label = QtGui.QLabel(self.centralwidget)
+        self.fft_segments_label.setObjectName(_fromUtf8("fft_segments_label"))
+        self.fft_hlayout.addWidget(self.fft_segments_label)
+        self.fft_segments_spin = QtGui.QSpinBox(self.centralwidget)
+        self.fft_segments_spin.setMinimum(1)
+        self.fft_segments_spin.setMaximum(32)
+        self.fft_segments_spin.setObjectName(_fromUtf8("fft_segments_spin"))
+        self.fft_hlayout.addWidget(self.fft_segments_spin)
+        self.fft_average_label = QtGui.QLabel(self.centralwidget)
+        self.fft_average_label.setObjectName(_fromUtf8("fft_average_label"))
+        self.fft_hlayout.addWidget(self.fft_average_label)
+        self.fft_average_combo = QtGui.QComboBox(self.centralwidget)
+        self.fft_average_combo.setObjectName(_fromUtf8("fft_average_combo"))
+        self.fft_average_combo.addItem(_fromUtf8(""))
+        self.fft_average_combo.addItem(_fromUtf8(""))
+        self.fft_average_combo.addItem(_fromUtf8(""))
+        self.fft_hlayout.addWidget(self.fft_average_combo)
+        self.logx_checkbox = QtGui.QCheckBox(self.centralwidget)
+        self.logx_checkbox.setObjectName(_fromUtf8("logx_checkbox"))
+        self.fft_hlayout.addWidget(self.logx_checkbox)
+        self.host_view_label = QtGui.QLabel(self.centralwidget)
+        self.host_view_label.setObjectName(_fromUtf8("host_view_label"))
+        self.fft_hlayout.addWidget(self.host_view_label)
+        self.host_view_combo = QtGui.QComboBox(self.centralwidget)
+        self.host_view_combo.setObjectName(_fromUtf8("host_view_combo"))
+        self.host_view_combo.addItem(_fromUtf8(""))
+        self.host_view_combo.addItem(_fromUtf8(""))
+        self.host_view_combo.addItem(_fromUtf8(""))
+        self.fft_hlayout.addWidget(self.host_view_combo)
+        self.accum_clear_button = QtGui.QPushButton(self.centralwidget)
+        self.accum_clear_button.setObjectName(_fromUtf8("accum_clear_button"))
+        self.fft_hlayout.addWidget(self.accum_clear_button)
+        self.math_label = QtGui.QLabel(self.centralwidget)
+        self.math_label.setObjectName(_fromUtf8("math_label"))
+        self.fft_hlayout.addWidget(self.math_label)
+        self.math_edit = QtGui.QLineEdit(self.centralwidget)
+        self.math_edit.setObjectName(_fromUtf8("math_edit"))
+        self.fft_hlayout.addWidget(self.math_edit)
+        self.mask_button = QtGui.QToolButton(self.centralwidget)
+        self.mask_button.setPopupMode(QtGui.QToolButton.InstantPopup)
+        self.mask_button.setObjectName(_fromUtf8("mask_button"))
+        self.fft_hlayout.addWidget(self.mask_button)
+        self.profile_button = QtGui.QToolButton(self.centralwidget)
+        self.profile_button.setPopupMode(QtGui.QToolButton.InstantPopup)
+        self.profile_button.setObjectName(_fromUtf8("profile_button"))
+        self.fft_hlayout.addWidget(self.profile_button)
+        spacerItem3 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.fft_hlayout.addItem(spacerItem3)
+        self.verticalLayout.addLayout(self.fft_hlayout)
         MainWindow.setCentralWidget(self.centralwidget)
         self.statusBar = QtGui.QStatusBar(MainWindow)
         self.statusBar.setObjectName(_fromUtf8("statusBar"))
         MainWindow.setStatusBar(self.statusBar)
 
         self.retranslateUi(MainWindow)
+        self.fft_window_combo.setCurrentIndex(1)
         QtCore.QObject.connect(self.acquire_button, QtCore.SIGNAL(_fromUtf8("clicked()")), MainWindow.Acquire)
+        QtCore.QObject.connect(self.run_button, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), MainWindow.run_toggled)
+        QtCore.QObject.connect(self.single_button, QtCore.SIGNAL(_fromUtf8("clicked()")), MainWindow.single)
         QtCore.QObject.connect(self.fft_button, QtCore.SIGNAL(_fromUtf8("clicked()")), MainWindow.calculateFFT)
         QtCore.QObject.connect(self.autoset_button, QtCore.SIGNAL(_fromUtf8("clicked()")), MainWindow.aset)
         QtCore.QObject.connect(self.ch1_checkbox, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), MainWindow.ch_toggled)
@@ -168,6 +273,14 @@ class Ui_MainWindow(object):
         QtCore.QObject.connect(self.ch2_coupling_combo, QtCore.SIGNAL(_fromUtf8("activated(QString)")), MainWindow.ch_coupling_changed)
         QtCore.QObject.connect(self.persist_checkbox, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), MainWindow.persist_toggled)
         QtCore.QObject.connect(self.equiv_checkbox, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), MainWindow.equiv_toggled)
+        QtCore.QObject.connect(self.record_checkbox, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), MainWindow.record_toggled)
+        QtCore.QObject.connect(self.fft_window_combo, QtCore.SIGNAL(_fromUtf8("activated(QString)")), MainWindow.fft_settings_changed)
+        QtCore.QObject.connect(self.fft_segments_spin, QtCore.SIGNAL(_fromUtf8("valueChanged(int)")), MainWindow.fft_settings_changed)
+        QtCore.QObject.connect(self.fft_average_combo, QtCore.SIGNAL(_fromUtf8("activated(QString)")), MainWindow.fft_settings_changed)
+        QtCore.QObject.connect(self.logx_checkbox, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), MainWindow.logx_toggled)
+        QtCore.QObject.connect(self.host_view_combo, QtCore.SIGNAL(_fromUtf8("activated(QString)")), MainWindow.host_view_changed)
+        QtCore.QObject.connect(self.accum_clear_button, QtCore.SIGNAL(_fromUtf8("clicked()")), MainWindow.accum_clear)
+        QtCore.QObject.connect(self.math_edit, QtCore.SIGNAL(_fromUtf8("editingFinished()")), MainWindow.math_changed)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
 
     def retranslateUi(self, MainWindow):
@@ -186,8 +299,37 @@ class Ui_MainWindow(object):
         self.ch2_lpfilter_checkbox.setText(_translate("MainWindow", "Low-pass filter", None))
         self.autoset_button.setText(_translate("MainWindow", "Autoset", None))
         self.acquire_button.setText(_translate("MainWindow", "Acquire", None))
+        self.run_button.setText(_translate("MainWindow", "Run", None))
+        self.single_button.setText(_translate("MainWindow", "Single", None))
         self.fft_button.setText(_translate("MainWindow", "FFT", None))
+        self.pool_button.setText(_translate("MainWindow", "Scopes", None))
+        self.measure_button.setText(_translate("MainWindow", "Measurements", None))
+        self.measure_mode_combo.setItemText(0, _translate("MainWindow", "Instrument", None))
+        self.measure_mode_combo.setItemText(1, _translate("MainWindow", "Host", None))
         self.longmem_checkbox.setText(_translate("MainWindow", "Long memory", None))
+        self.binary_checkbox.setText(_translate("MainWindow", "Binary transfer", None))
+        self.preview_checkbox.setText(_translate("MainWindow", "Preview", None))
         self.persist_checkbox.setText(_translate("MainWindow", "Persistence", None))
         self.equiv_checkbox.setText(_translate("MainWindow", "Equiv. sampling", None))
+        self.record_checkbox.setText(_translate("MainWindow", "Record", None))
+        self.fft_window_label.setText(_translate("MainWindow", "FFT window", None))
+        self.fft_window_combo.setItemText(0, _translate("MainWindow", "Rectangular", None))
+        self.fft_window_combo.setItemText(1, _translate("MainWindow", "Hann", None))
+        self.fft_window_combo.setItemText(2, _translate("MainWindow", "Blackman-Harris", None))
+        self.fft_window_combo.setItemText(3, _translate("MainWindow", "Flat-top", None))
+        self.fft_segments_label.setText(_translate("MainWindow", "Segments", None))
+        self.fft_average_label.setText(_translate("MainWindow", "Averaging", None))
+        self.fft_average_combo.setItemText(0, _translate("MainWindow", "None", None))
+        self.fft_average_combo.setItemText(1, _translate("MainWindow", "Exponential", None))
+        self.fft_average_combo.setItemText(2, _translate("MainWindow", "Peak hold", None))
+        self.logx_checkbox.setText(_translate("MainWindow", "Log frequency", None))
+        self.host_view_label.setText(_translate("MainWindow", "Accumulate", None))
+        self.host_view_combo.setItemText(0, _translate("MainWindow", "Off", None))
+        self.host_view_combo.setItemText(1, _translate("MainWindow", "Average", None))
+        self.host_view_combo.setItemText(2, _translate("MainWindow", "Persistence", None))
+        self.accum_clear_button.setText(_translate("MainWindow", "Clear", None))
+        self.math_label.setText(_translate("MainWindow", "Math", None))
+        self.math_edit.setPlaceholderText(_translate("MainWindow", "CH1 - CH2; LPF(CH1, 10e3)", None))
+        self.mask_button.setText(_translate("MainWindow", "Mask", None))
+        self.profile_button.setText(_translate("MainWindow", "Profile", None))
 
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2017 Daniel Sangorrin
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all
+#   copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#   SOFTWARE.
+
+import time
+from PyQt4 import QtCore
+
+class AcquisitionWorker(QtCore.QThread):
+    """Acquires frames in a loop and pushes them into a FrameRing.
+
+    acquire is called with settings and must return a frame dict with the
+    'channels' and their 'waves' (Waveforms). frameReady is emitted at most
+    max_fps times per second; the GUI takes the newest frame from the ring.
+    Every frame is also appended to recording, added to accumulator and
+    checked by masks if they are given.
+    """
+    frameReady = QtCore.pyqtSignal()
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, acquire, settings, ring, count=None, max_fps=10.0,
+                 recording=None, accumulator=None, masks=None, parent=None):
+        super(AcquisitionWorker, self).__init__(parent)
+        self.acquire = acquire
+        self.settings = settings
+        self.ring = ring
+        self.count = count
+        self.max_fps = max_fps
+        self.recording = recording
+        self.accumulator = accumulator
+        self.masks = masks
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        self.running = True
+        acquired = 0
+        last_emit = 0.0
+        while self.running and (self.count is None or acquired < self.count):
+            try:
+                frame = self.acquire(self.settings)
+            except Exception as e:
+                self.failed.emit('Acquisition failed: %s' % e)
+                break
+            try:
+                if self.recording is not None:
+                    self.recording.append(frame)
+                if self.accumulator is not None:
+                    self.accumulator.add(frame)
+                if self.masks is not None:
+                    self.masks.add(frame)
+                waves = frame.pop('waves')
+                self.ring.push([waves[channel] for channel in frame['channels']], frame)
+            except Exception as e:
+                self.failed.emit('Processing failed: %s' % e)
+                break
+            acquired += 1
+            now = time.time()
+            if now - last_emit >= 1.0 / self.max_fps:
+                last_emit = now
+                self.frameReady.emit()
+        # make sure the last frame gets drawn
+        if acquired:
+            self.frameReady.emit()